@@ -1,5 +1,13 @@
+# Permite importar app e socketio de app diretamente.
+# Por exemplo: from app import app, socketio
+#
+# O servidor só é carregado quando um desses nomes é usado: os processos de
+# análise de trilhas importam módulos do pacote (app.tracks) e não devem
+# iniciar o agendador, o SocketIO e o banco de dados.
 
-from app.routes import app, socketio
 
-# Este arquivo permite importar app e socketio de app diretamente.
-# Por exemplo: from app import app, socketio
\ No newline at end of file
+def __getattr__(name):
+    if name in ('app', 'socketio'):
+        from app import routes
+        return getattr(routes, name)
+    raise AttributeError(f"module 'app' has no attribute {name!r}")
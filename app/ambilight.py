@@ -1,8 +1,573 @@
 
 import cv2
 import numpy as np
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Union, Sequence, Optional
+import os
+import struct
 import time
+import threading
+
+# Ordem das bordas nos resultados em formato de array
+SIDES = ('top', 'right', 'bottom', 'left')
+
+# Profundidade das faixas de borda analisadas (fração da dimensão)
+BORDER_DEPTH = 0.05
+
+# Modos de cálculo da cor de cada zona
+COLOR_MODES = ('average', 'dominant')
+
+# Bits por canal na quantização do modo 'dominant' (3 bits = 512 cores por zona)
+DOMINANT_BITS = 3
+
+# Passos de amostragem avaliados na calibração do orçamento de erro
+SAMPLING_STRIDES = (2, 3, 4, 6, 8, 12, 16)
+
+
+def _zone_bounds(length: int, num_zones: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula o início e o tamanho de cada zona ao longo de uma borda.
+    
+    As zonas têm tamanho igual e a última se estende até o fim da borda.
+    
+    Args:
+        length: Comprimento da borda em pixels
+        num_zones: Número de zonas
+        
+    Returns:
+        Tupla (inícios, tamanhos) como arrays numpy
+    """
+    zone_size = length // num_zones
+    starts = np.arange(num_zones) * zone_size
+    counts = np.diff(np.append(starts, length))
+    return starts, np.maximum(counts, 1)
+
+
+def zones_to_dict(zones: np.ndarray) -> Dict[str, List[List[int]]]:
+    """
+    Converte o array de zonas para o formato de dicionário usado pelos clientes.
+    
+    Args:
+        zones: Array de forma (4, zonas, 3) na ordem de SIDES
+        
+    Returns:
+        Dicionário com as cores de cada borda (top, right, bottom, left)
+    """
+    return dict(zip(SIDES, zones.tolist()))
+
+
+class ColorFrame:
+    """
+    Resultado compacto da extração: cores das zonas como um array uint8 de
+    forma fixa (4, zonas, 3), indexado por borda na ordem de SIDES.
+    
+    O formato binário é um cabeçalho de 4 bytes (versão, número de bordas,
+    zonas por borda) seguido das cores [R, G, B] de cada zona, borda a borda.
+    Na versão 2, usada nas mensagens ao vivo, o cabeçalho é seguido de uma
+    marcação de 16 bytes antes das cores: fluxo e sequência (uint32) e o
+    instante do frame em segundos (float64). O fluxo identifica a origem da
+    numeração, para que o cliente a reinicie quando ela muda.
+    """
+    
+    HEADER = struct.Struct('<BBH')
+    VERSION = 1
+    STAMP = struct.Struct('<IId')
+    STAMPED_VERSION = 2
+    
+    def __init__(self, zones: np.ndarray, stamp: Optional[Tuple[int, int, float]] = None):
+        """
+        Inicializa o resultado.
+        
+        Args:
+            zones: Array (4, zonas, 3) uint8 na ordem de SIDES
+            stamp: Marcação opcional (fluxo, sequência, instante do frame)
+        """
+        if zones.ndim != 3 or zones.shape[0] != len(SIDES) or zones.shape[2] != 3:
+            raise ValueError(f"Formato de zonas inválido: {zones.shape}")
+        self.zones = np.ascontiguousarray(zones, dtype=np.uint8)
+        self.stamp = stamp
+    
+    @property
+    def zones_per_side(self) -> int:
+        """Número de zonas por borda."""
+        return self.zones.shape[1]
+    
+    def side(self, name: str) -> np.ndarray:
+        """Cores (zonas, 3) de uma borda, sem cópia."""
+        return self.zones[SIDES.index(name)]
+    
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.side(name)
+    
+    def scaled(self, intensity: float) -> 'ColorFrame':
+        """Retorna um novo resultado com a intensidade aplicada em uma única multiplicação."""
+        scale = _intensity_scale(intensity)
+        if scale >= 256:
+            return self
+        return ColorFrame(((self.zones.astype(np.uint16) * scale) >> 8).astype(np.uint8))
+    
+    def to_dict(self) -> Dict[str, List[List[int]]]:
+        """Converte para o dicionário {borda: [[R, G, B], ...]} usado pelos clientes JSON."""
+        return zones_to_dict(self.zones)
+    
+    def to_bytes(self) -> bytes:
+        """Serializa no formato binário compacto (versão 2 se houver marcação)."""
+        if self.stamp is None:
+            return self.HEADER.pack(self.VERSION, len(SIDES), self.zones_per_side) + self.zones.tobytes()
+        return (self.HEADER.pack(self.STAMPED_VERSION, len(SIDES), self.zones_per_side)
+                + self.STAMP.pack(*self.stamp) + self.zones.tobytes())
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ColorFrame':
+        """
+        Desserializa um resultado no formato binário compacto.
+        
+        Args:
+            data: Bytes produzidos por to_bytes
+            
+        Returns:
+            Resultado reconstruído, com a marcação se a versão tiver uma
+            
+        Raises:
+            ValueError: Se a versão, o número de bordas ou o tamanho forem inválidos
+        """
+        version, sides, zones_per_side = cls.HEADER.unpack_from(data)
+        if version not in (cls.VERSION, cls.STAMPED_VERSION) or sides != len(SIDES):
+            raise ValueError(f"Formato binário de cores não suportado (versão {version}, {sides} bordas)")
+        
+        offset = cls.HEADER.size
+        stamp = None
+        if version == cls.STAMPED_VERSION:
+            stamp = cls.STAMP.unpack_from(data, offset)
+            offset += cls.STAMP.size
+        
+        size = sides * zones_per_side * 3
+        if len(data) < offset + size:
+            raise ValueError("Dados binários de cores truncados")
+        payload = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+        return cls(payload.reshape(sides, zones_per_side, 3), stamp)
+
+
+def detect_active_area(video_path: str, samples: int = 5, threshold: int = 16) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Detecta a área útil da imagem, descontando tarjas pretas (letterbox/pillarbox).
+    
+    Alguns frames espalhados pelo vídeo são amostrados, e linhas/colunas cujo
+    brilho nunca passa do limiar em nenhum deles são consideradas tarja.
+    
+    Args:
+        video_path: Caminho para o arquivo de vídeo
+        samples: Número de frames amostrados
+        threshold: Brilho médio (0-255) abaixo do qual uma linha/coluna é tarja
+        
+    Returns:
+        Tupla (x0, y0, x1, y1) da área útil, ou None se o vídeo não puder ser lido
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        positions = np.linspace(0.1, 0.9, samples) * max(frame_count - 1, 0)
+        
+        row_levels = col_levels = None
+        for position in positions.astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            
+            # Brilho por linha/coluna usando o canal mais intenso de cada pixel
+            brightness = frame.max(axis=2)
+            rows = brightness.mean(axis=1)
+            cols = brightness.mean(axis=0)
+            row_levels = rows if row_levels is None else np.maximum(row_levels, rows)
+            col_levels = cols if col_levels is None else np.maximum(col_levels, cols)
+        
+        if row_levels is None:
+            return None
+        
+        height, width = len(row_levels), len(col_levels)
+        active_rows = np.flatnonzero(row_levels > threshold)
+        active_cols = np.flatnonzero(col_levels > threshold)
+        
+        # Vídeo todo escuro nas amostras, ou área útil pequena demais para ser confiável
+        if (len(active_rows) == 0 or len(active_cols) == 0
+                or active_rows[-1] - active_rows[0] + 1 < height // 2
+                or active_cols[-1] - active_cols[0] + 1 < width // 2):
+            return (0, 0, width, height)
+        
+        return (int(active_cols[0]), int(active_rows[0]), int(active_cols[-1]) + 1, int(active_rows[-1]) + 1)
+    finally:
+        cap.release()
+
+
+# Cache de áreas úteis por arquivo: (caminho, mtime, tamanho) -> área
+_active_area_cache: Dict[Tuple[str, float, int], Optional[Tuple[int, int, int, int]]] = {}
+_active_area_lock = threading.Lock()
+
+
+def get_active_area(video_path: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Retorna a área útil de um vídeo, detectando-a apenas uma vez por arquivo.
+    
+    Args:
+        video_path: Caminho para o arquivo de vídeo
+        
+    Returns:
+        Tupla (x0, y0, x1, y1) da área útil, ou None se o vídeo não puder ser lido
+    """
+    try:
+        stats = os.stat(video_path)
+    except OSError:
+        return None
+    
+    key = (os.path.abspath(video_path), stats.st_mtime, stats.st_size)
+    with _active_area_lock:
+        if key in _active_area_cache:
+            return _active_area_cache[key]
+    
+    area = detect_active_area(video_path)
+    with _active_area_lock:
+        _active_area_cache[key] = area
+    return area
+
+
+class ZoneLayout:
+    """
+    Geometria de zonas de um layout de LEDs.
+    
+    Cada zona é um retângulo (x0, y0, x1, y1) em coordenadas normalizadas do
+    frame (0.0 - 1.0), e as zonas são agrupadas por nome (ex: 'top', 'corners').
+    Como as coordenadas são relativas, o mesmo layout serve qualquer resolução.
+    """
+    
+    def __init__(self, name: str, groups: Dict[str, Sequence[Tuple[float, float, float, float]]]):
+        """
+        Inicializa o layout.
+        
+        Args:
+            name: Nome do layout
+            groups: Dicionário grupo -> lista de retângulos (x0, y0, x1, y1)
+        """
+        self.name = name
+        self.groups = {
+            group: np.clip(np.asarray(rects, dtype=np.float64).reshape(-1, 4), 0.0, 1.0)
+            for group, rects in groups.items()
+        }
+    
+    @property
+    def depth(self) -> float:
+        """Profundidade (fração do frame) necessária para cobrir todas as zonas a partir das bordas."""
+        depth = 0.0
+        for rects in self.groups.values():
+            if len(rects):
+                x0, y0, x1, y1 = rects.T
+                needed = np.minimum(np.minimum(y1, 1.0 - y0), np.minimum(x1, 1.0 - x0))
+                depth = max(depth, float(needed.max()))
+        return depth
+    
+    @staticmethod
+    def _side_rects(edges_h: np.ndarray, edges_v: np.ndarray, depth_start: float, depth_end: float) -> Dict[str, List[Tuple[float, float, float, float]]]:
+        """Gera os retângulos das quatro bordas a partir das divisões de cada eixo."""
+        return {
+            'top': [(a, depth_start, b, depth_end) for a, b in zip(edges_h[:-1], edges_h[1:])],
+            'right': [(1.0 - depth_end, a, 1.0 - depth_start, b) for a, b in zip(edges_v[:-1], edges_v[1:])],
+            'bottom': [(a, 1.0 - depth_end, b, 1.0 - depth_start) for a, b in zip(edges_h[:-1], edges_h[1:])],
+            'left': [(depth_start, a, depth_end, b) for a, b in zip(edges_v[:-1], edges_v[1:])],
+        }
+    
+    @classmethod
+    def uniform(cls, zones_per_side: int, depth: float = 0.05, name: str = None) -> 'ZoneLayout':
+        """Layout padrão: zonas iguais em cada borda, com profundidade fixa."""
+        edges = np.linspace(0.0, 1.0, zones_per_side + 1)
+        return cls(name or f'uniform_{zones_per_side}', cls._side_rects(edges, edges, 0.0, depth))
+    
+    @classmethod
+    def with_corners(cls, zones_per_side: int, depth: float = 0.05, name: str = None) -> 'ZoneLayout':
+        """Layout uniforme com uma zona extra em cada canto (tl, tr, br, bl)."""
+        edges = np.linspace(depth, 1.0 - depth, zones_per_side + 1)
+        groups = cls._side_rects(edges, edges, 0.0, depth)
+        groups['corners'] = [
+            (0.0, 0.0, depth, depth),
+            (1.0 - depth, 0.0, 1.0, depth),
+            (1.0 - depth, 1.0 - depth, 1.0, 1.0),
+            (0.0, 1.0 - depth, depth, 1.0),
+        ]
+        return cls(name or f'corners_{zones_per_side}', groups)
+    
+    @classmethod
+    def rings(cls, zones_per_side: int, depths: Sequence[float] = (0.02, 0.05, 0.1), name: str = None) -> 'ZoneLayout':
+        """Layout com vários anéis de profundidade; os grupos são nomeados 'top_0', 'top_1', ..."""
+        edges = np.linspace(0.0, 1.0, zones_per_side + 1)
+        groups = {}
+        depth_start = 0.0
+        for ring, depth_end in enumerate(depths):
+            for side, rects in cls._side_rects(edges, edges, depth_start, depth_end).items():
+                groups[f'{side}_{ring}'] = rects
+            depth_start = depth_end
+        return cls(name or f'rings_{zones_per_side}x{len(depths)}', groups)
+    
+    @classmethod
+    def weighted(cls, widths_h: Sequence[float], widths_v: Sequence[float], depth: float = 0.05, name: str = None) -> 'ZoneLayout':
+        """
+        Layout com zonas de larguras diferentes (ex: telas ultrawide).
+        
+        Args:
+            widths_h: Larguras relativas das zonas de top/bottom, da esquerda para a direita
+            widths_v: Alturas relativas das zonas de left/right, de cima para baixo
+            depth: Profundidade das zonas
+        """
+        edges_h = np.concatenate(([0.0], np.cumsum(widths_h, dtype=np.float64) / np.sum(widths_h)))
+        edges_v = np.concatenate(([0.0], np.cumsum(widths_v, dtype=np.float64) / np.sum(widths_v)))
+        return cls(name or f'weighted_{len(widths_h)}x{len(widths_v)}', cls._side_rects(edges_h, edges_v, 0.0, depth))
+
+
+class BorderIntegral:
+    """
+    Imagem integral (summed-area table) da área de borda de um frame.
+    
+    Construída uma vez por frame sobre as quatro faixas de borda, permite obter
+    a média de qualquer retângulo contido nessas faixas em O(1), de modo que
+    vários layouts podem ser avaliados sobre o mesmo frame sem reler os pixels.
+    """
+    
+    def __init__(self, frame: np.ndarray, depth: float = 0.05):
+        """
+        Constrói as tabelas integrais das faixas de borda.
+        
+        Args:
+            frame: Frame do vídeo em formato numpy array (BGR)
+            depth: Profundidade das faixas como fração da altura/largura
+        """
+        self.frame = frame
+        self.height, self.width = frame.shape[:2]
+        self.depth_v = min(self.height, max(1, int(np.ceil(self.height * depth))))
+        self.depth_h = min(self.width, max(1, int(np.ceil(self.width * depth))))
+        
+        # (tabela integral, deslocamento y, deslocamento x) para cada faixa, na ordem de SIDES
+        self.tables = (
+            (self._integral(frame[:self.depth_v]), 0, 0),
+            (self._integral(frame[:, self.width - self.depth_h:]), 0, self.width - self.depth_h),
+            (self._integral(frame[self.height - self.depth_v:]), self.height - self.depth_v, 0),
+            (self._integral(frame[:, :self.depth_h]), 0, 0),
+        )
+    
+    @staticmethod
+    def _integral(strip: np.ndarray) -> np.ndarray:
+        """Calcula a tabela integral (h+1, w+1, 3) de uma faixa."""
+        height, width = strip.shape[:2]
+        # int32 é suficiente enquanto a soma da faixa inteira couber nele
+        sdepth = cv2.CV_32S if height * width * 255 < 2 ** 31 else cv2.CV_64F
+        return cv2.integral(np.ascontiguousarray(strip), sdepth=sdepth)
+    
+    def _to_pixels(self, rects: np.ndarray) -> np.ndarray:
+        """Converte retângulos normalizados para coordenadas inteiras em pixels."""
+        scale = np.array([self.width, self.height, self.width, self.height], dtype=np.float64)
+        pixels = np.rint(rects * scale).astype(np.int64)
+        # Garante pelo menos um pixel em cada dimensão
+        pixels[:, 2] = np.maximum(pixels[:, 2], np.minimum(pixels[:, 0] + 1, self.width))
+        pixels[:, 3] = np.maximum(pixels[:, 3], np.minimum(pixels[:, 1] + 1, self.height))
+        pixels[:, 0] = np.minimum(pixels[:, 0], pixels[:, 2] - 1)
+        pixels[:, 1] = np.minimum(pixels[:, 1], pixels[:, 3] - 1)
+        return pixels
+    
+    def mean(self, rects: np.ndarray) -> np.ndarray:
+        """
+        Calcula a cor média de cada retângulo.
+        
+        Args:
+            rects: Array (n, 4) de retângulos normalizados (x0, y0, x1, y1)
+            
+        Returns:
+            Array (n, 3) uint8 com as cores médias, ainda em BGR
+        """
+        pixels = self._to_pixels(rects)
+        x0, y0, x1, y1 = pixels.T
+        sums = np.zeros((len(pixels), 3), dtype=np.int64)
+        pending = np.ones(len(pixels), dtype=bool)
+        
+        containment = (
+            y1 <= self.depth_v,
+            x0 >= self.width - self.depth_h,
+            y0 >= self.height - self.depth_v,
+            x1 <= self.depth_h,
+        )
+        for (table, off_y, off_x), inside in zip(self.tables, containment):
+            selected = pending & inside
+            if not selected.any():
+                continue
+            ty0, ty1 = y0[selected] - off_y, y1[selected] - off_y
+            tx0, tx1 = x0[selected] - off_x, x1[selected] - off_x
+            corners = [table[ty, tx].astype(np.int64) for ty, tx in ((ty1, tx1), (ty0, tx1), (ty1, tx0), (ty0, tx0))]
+            sums[selected] = corners[0] - corners[1] - corners[2] + corners[3]
+            pending &= ~selected
+        
+        # Retângulos fora das faixas de borda são somados diretamente do frame
+        for i in np.flatnonzero(pending):
+            sums[i] = self.frame[y0[i]:y1[i], x0[i]:x1[i]].sum(axis=(0, 1), dtype=np.int64)
+        
+        areas = (x1 - x0) * (y1 - y0)
+        return (sums // areas[:, None]).astype(np.uint8)
+
+
+def _border_widths(height: int, width: int) -> Tuple[int, int]:
+    """Profundidade das faixas de borda analisadas (BORDER_DEPTH da dimensão)."""
+    border_width_v = max(1, int(height * BORDER_DEPTH))  # Vertical (top/bottom)
+    border_width_h = max(1, int(width * BORDER_DEPTH))   # Horizontal (left/right)
+    return border_width_v, border_width_h
+
+
+def _intensity_scale(intensity: float) -> int:
+    """Converte a intensidade (0.0 - 1.0) para ponto fixo com 8 bits de fração."""
+    return int(round(max(0.0, min(intensity, 1.0)) * 256))
+
+
+class ProfileBuffers:
+    """
+    Buffers reutilizados no cálculo das zonas de um frame.
+    
+    Alocados uma vez por combinação (altura, largura, zonas) e reaproveitados a
+    cada frame, para que o caminho de processamento ao vivo não aloque arrays.
+    Somas são acumuladas em uint32 sempre que a soma de uma faixa inteira cabe
+    nele, e as médias usam divisão inteira.
+    """
+    
+    def __init__(self, height: int, width: int, num_zones: int):
+        """
+        Aloca os buffers para frames de um tamanho e número de zonas.
+        
+        Args:
+            height: Altura do frame (já recortado para a área útil)
+            width: Largura do frame
+            num_zones: Número de zonas por borda
+        """
+        self.key = (height, width, num_zones)
+        border_width_v, border_width_h = _border_widths(height, width)
+        max_sum = max(border_width_v * width, border_width_h * height) * 255
+        self.dtype = np.uint32 if max_sum < 2 ** 32 else np.uint64
+        
+        lengths = (width, height, width, height)
+        self.sides = [np.empty((length, 3), dtype=self.dtype) for length in lengths]
+        # A primeira linha das somas acumuladas é sempre zero
+        self.cumulative = [np.zeros((length + 1, 3), dtype=self.dtype) for length in lengths]
+        
+        x_starts, x_counts = _zone_bounds(width, num_zones)
+        y_starts, y_counts = _zone_bounds(height, num_zones)
+        x_ends = np.append(x_starts[1:], width)
+        y_ends = np.append(y_starts[1:], height)
+        self.starts = (x_starts, y_starts, x_starts, y_starts)
+        self.ends = (x_ends, y_ends, x_ends, y_ends)
+        self.counts = np.stack([
+            x_counts * border_width_v, y_counts * border_width_h,
+            x_counts * border_width_v, y_counts * border_width_h,
+        ]).astype(self.dtype)[..., None]
+        
+        self.zone_sums = np.empty((len(SIDES), num_zones, 3), dtype=self.dtype)
+        self.zone_starts = np.empty((num_zones, 3), dtype=self.dtype)
+        self.output = np.empty((len(SIDES), num_zones, 3), dtype=np.uint8)
+
+
+class BorderProfile:
+    """
+    Perfil das quatro bordas de um frame na resolução de um pixel.
+    
+    Cada faixa de borda é reduzida à soma ao longo da sua profundidade e
+    guardada como soma acumulada ao longo da borda. É a grade mais fina
+    possível: qualquer divisão em zonas é obtida por diferenças dessas somas,
+    com o mesmo resultado de ler os pixels novamente.
+    """
+    
+    def __init__(self, frame: np.ndarray, buffers: ProfileBuffers = None):
+        """
+        Calcula o perfil a partir das faixas de borda (5% de cada dimensão).
+        
+        Args:
+            frame: Frame (H, W, 3) ou pilha de frames (N, H, W, 3) em BGR
+            buffers: Buffers pré-alocados para o tamanho do frame (apenas frame
+                único). Com eles, o perfil e o resultado de zones() são
+                sobrescritos pelo próximo frame que usar os mesmos buffers.
+        """
+        height, width = frame.shape[-3:-1]
+        self.height = height
+        self.width = width
+        self.buffers = buffers
+        self.border_width_v, self.border_width_h = _border_widths(height, width)
+        
+        strips = (
+            (frame[..., :self.border_width_v, :, :], -3),           # top: (W, 3)
+            (frame[..., width - self.border_width_h:, :], -2),        # right: (H, 3)
+            (frame[..., height - self.border_width_v:, :, :], -3),  # bottom: (W, 3)
+            (frame[..., :self.border_width_h, :], -2),              # left: (H, 3)
+        )
+        
+        if buffers is not None:
+            # Soma de cada faixa e soma acumulada direto nos buffers, sem alocação
+            for (strip, axis), side, cumulative in zip(strips, buffers.sides, buffers.cumulative):
+                np.sum(strip, axis=axis, dtype=buffers.dtype, out=side)
+                np.cumsum(side, axis=0, dtype=buffers.dtype, out=cumulative[1:])
+            self.cumulative = buffers.cumulative
+            return
+        
+        # Somas acumuladas com um zero inicial: soma de [a, b) = cumulative[b] - cumulative[a]
+        self.cumulative = []
+        for strip, axis in strips:
+            profile = strip.sum(axis=axis, dtype=np.uint64)
+            cumulative = np.zeros(profile.shape[:-2] + (profile.shape[-2] + 1, 3), dtype=np.uint64)
+            np.cumsum(profile, axis=-2, out=cumulative[..., 1:, :])
+            self.cumulative.append(cumulative)
+    
+    def zones(self, num_zones: int, intensity: float = 1.0, reuse_buffers: bool = True) -> np.ndarray:
+        """
+        Calcula as cores médias para um número qualquer de zonas por borda.
+        
+        Args:
+            num_zones: Número de zonas por borda
+            intensity: Intensidade aplicada em ponto fixo (0.0 - 1.0)
+            reuse_buffers: Se False, nunca escreve nos buffers do perfil
+            
+        Returns:
+            Array uint8 (4, num_zones, 3) ou (N, 4, num_zones, 3) com as cores [R, G, B].
+            Se os buffers do perfil forem para num_zones, o array retornado é o
+            buffer de saída, reutilizado no próximo frame.
+        """
+        scale = _intensity_scale(intensity)
+        buffers = self.buffers
+        if reuse_buffers and buffers is not None and buffers.key == (self.height, self.width, num_zones):
+            sums = buffers.zone_sums
+            for i, cumulative in enumerate(self.cumulative):
+                np.take(cumulative, buffers.ends[i], axis=0, out=sums[i])
+                np.take(cumulative, buffers.starts[i], axis=0, out=buffers.zone_starts)
+                np.subtract(sums[i], buffers.zone_starts, out=sums[i])
+            np.floor_divide(sums, buffers.counts, out=sums)
+            if scale < 256:
+                np.multiply(sums, scale, out=sums)
+                np.right_shift(sums, 8, out=sums)
+            # BGR -> RGB na cópia para o buffer de saída
+            np.copyto(buffers.output, sums[..., ::-1], casting='unsafe')
+            return buffers.output
+        
+        x_starts, x_counts = _zone_bounds(self.width, num_zones)
+        y_starts, y_counts = _zone_bounds(self.height, num_zones)
+        x_ends = np.append(x_starts[1:], self.width)
+        y_ends = np.append(y_starts[1:], self.height)
+        bounds = (
+            (x_starts, x_ends, x_counts * self.border_width_v),
+            (y_starts, y_ends, y_counts * self.border_width_h),
+            (x_starts, x_ends, x_counts * self.border_width_v),
+            (y_starts, y_ends, y_counts * self.border_width_h),
+        )
+        
+        result = np.empty(self.cumulative[0].shape[:-2] + (len(SIDES), num_zones, 3), dtype=np.uint64)
+        for i, (cumulative, (starts, ends, counts)) in enumerate(zip(self.cumulative, bounds)):
+            sums = cumulative[..., ends, :].astype(np.uint64) - cumulative[..., starts, :]
+            result[..., i, :, :] = sums // counts[:, None].astype(np.uint64)
+        if scale < 256:
+            result = (result * scale) >> 8
+        
+        # BGR -> RGB apenas nas cores resultantes
+        return np.ascontiguousarray(result[..., ::-1], dtype=np.uint8)
+
 
 class AmbilightProcessor:
     """
@@ -22,16 +587,30 @@ class AmbilightProcessor:
         self.zones_per_side = zones_per_side
         self.intensity = intensity
         self.blur_amount = blur_amount
-        self.frame_cache = {}
+        self.color_mode = 'average'
+        self.active_area = None
+        self.last_profile = None
+        self._buffers = None
+        # Protege os buffers do caminho ao vivo, lidos por zones_from_profile de outra thread
+        self._profile_lock = threading.Lock()
         self.last_processed_time = 0
         self.processing_interval = 1 / 30  # Processa no máximo 30 frames por segundo
+        
+        # Amostragem espaçada das bordas (desativada enquanto o orçamento for None)
+        self.sampling_error_budget = None
+        self.sampling_stride = 1
+        self.last_sampling_error = 0.0
+        self.calibration_interval = 150  # Frames entre recalibrações do passo
+        self._frames_since_calibration = 0
     
-    def extract_border_colors(self, frame: np.ndarray) -> Dict[str, List[List[int]]]:
+    def extract_border_colors(self, frame: np.ndarray, as_array: bool = False) -> Union[Dict[str, List[List[int]]], np.ndarray]:
         """
         Extrai as cores das bordas de um frame de vídeo.
         
         Args:
             frame: Frame do vídeo em formato numpy array (BGR)
+            as_array: Se True, retorna o array (4, zonas, 3) de compute_zone_array,
+                sobrescrito no próximo frame
             
         Returns:
             Dicionário com as cores médias para cada borda (top, right, bottom, left)
@@ -42,91 +621,334 @@ class AmbilightProcessor:
         if current_time - self.last_processed_time < self.processing_interval:
             # Retorna o último resultado se tiver processado recentemente
             if hasattr(self, 'last_result'):
-                return self.last_result
+                return self.last_result if as_array else zones_to_dict(self.last_result)
         
         self.last_processed_time = current_time
         
-        # Converte de BGR para RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # Sem cópia: o array só é sobrescrito pelo próximo frame, que também substitui last_result
+        result = self.compute_zone_array(frame)
+        
+        # Armazena o resultado para uso em cache
+        self.last_result = result
+        return result if as_array else zones_to_dict(result)
+    
+    def extract_color_frame(self, frame: np.ndarray) -> ColorFrame:
+        """
+        Extrai as cores das bordas como um ColorFrame compacto.
+        
+        Segue o mesmo limite de processing_interval de extract_border_colors. As
+        zonas do resultado são sobrescritas no próximo frame: quem as guarda
+        deve copiá-las.
+        
+        Args:
+            frame: Frame do vídeo em formato numpy array (BGR)
+            
+        Returns:
+            Resultado com as cores de todas as zonas
+        """
+        return ColorFrame(self.extract_border_colors(frame, as_array=True))
+    
+    def compute_zone_array(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Calcula as cores de todas as zonas das quatro bordas de uma só vez.
+        
+        Apenas as faixas de borda são lidas: cada faixa é reduzida a um perfil
+        (ver BorderProfile) e as zonas são obtidas desse perfil, sem laço em
+        Python por zona e sem converter o frame inteiro de BGR para RGB (a
+        troca de canais é feita no resultado).
+        
+        Args:
+            frame: Frame do vídeo em formato numpy array (BGR), de forma (H, W, 3)
+                ou uma pilha de frames (N, H, W, 3)
+            
+        Returns:
+            Array uint8 de forma (4, zones_per_side, 3) com as cores [R, G, B],
+            na ordem de SIDES, ou (N, 4, zones_per_side, 3) para uma pilha. Para
+            um frame único no modo 'average', é o buffer de saída do processador,
+            sobrescrito no próximo frame
+        """
+        frame = self._crop_to_active_area(frame)
+        
+        if self.sampling_error_budget is not None:
+            self._frames_since_calibration += 1
+            if self._frames_since_calibration >= self.calibration_interval:
+                self._calibrate_sampling_stride(frame if frame.ndim == 3 else frame[0])
+            if self.sampling_stride > 1:
+                frame = frame[..., ::self.sampling_stride, ::self.sampling_stride, :]
+        
+        if self.color_mode == 'dominant':
+            return self._apply_intensity(self._dominant_zone_array(frame))
+        
+        if frame.ndim == 3:
+            # Caminho ao vivo: buffers reutilizados, resultado sobrescrito no próximo frame.
+            # O perfil guardado aponta para os buffers; zones_from_profile o lê sob o lock
+            with self._profile_lock:
+                profile = self._profile(frame, reuse_buffers=True)
+                self.last_profile = profile
+                return profile.zones(self.zones_per_side, self.intensity)
+        return self._profile(frame).zones(self.zones_per_side, self.intensity)
+    
+    def _calibrate_sampling_stride(self, frame: np.ndarray) -> None:
+        """
+        Escolhe o maior passo de amostragem cujo erro medido cabe no orçamento.
+        
+        O erro é a maior diferença por canal, em qualquer zona, entre as cores
+        calculadas com todos os pixels e com a amostragem, neste frame.
+        
+        Args:
+            frame: Frame (H, W, 3) em BGR, já recortado para a área útil
+        """
+        def zones_for(sample: np.ndarray) -> np.ndarray:
+            if self.color_mode == 'dominant':
+                return self._dominant_zone_array(sample).astype(np.int16)
+            return BorderProfile(sample).zones(self.zones_per_side).astype(np.int16)
+        
+        reference = zones_for(frame)
+        self.sampling_stride = 1
+        self.last_sampling_error = 0.0
+        for stride in SAMPLING_STRIDES:
+            error = float(np.abs(zones_for(frame[::stride, ::stride]) - reference).max())
+            if error <= self.sampling_error_budget:
+                self.sampling_stride = stride
+                self.last_sampling_error = error
+        
+        self._frames_since_calibration = 0
+    
+    def compute_profile(self, frame: np.ndarray, reuse_buffers: bool = False) -> BorderProfile:
+        """
+        Lê as faixas de borda do frame uma única vez e gera o seu perfil.
+        
+        O perfil serve qualquer número de zonas por borda sem voltar aos
+        pixels (ver BorderProfile.zones).
+        
+        Args:
+            frame: Frame (H, W, 3) ou pilha de frames (N, H, W, 3) em BGR
+            reuse_buffers: Se True (apenas frame único), usa os buffers do
+                processador; o perfil é então sobrescrito pelo próximo frame
+            
+        Returns:
+            Perfil das quatro bordas
+        """
+        return self._profile(self._crop_to_active_area(frame), reuse_buffers)
+    
+    def _profile(self, frame: np.ndarray, reuse_buffers: bool = False) -> BorderProfile:
+        """Gera o perfil de um frame já recortado para a área útil."""
+        if not reuse_buffers or frame.ndim != 3:
+            return BorderProfile(frame)
         
         height, width = frame.shape[:2]
+        key = (height, width, self.zones_per_side)
+        if self._buffers is None or self._buffers.key != key:
+            self._buffers = ProfileBuffers(*key)
+        return BorderProfile(frame, self._buffers)
+    
+    def zones_from_profile(self, profile: 'BorderProfile' = None) -> Optional[np.ndarray]:
+        """
+        Deriva as cores das zonas de um perfil já calculado, com as configurações atuais.
         
-        # Define a largura da borda para análise (5% da dimensão)
-        border_width_v = max(1, int(height * 0.05))  # Vertical (top/bottom)
-        border_width_h = max(1, int(width * 0.05))   # Horizontal (left/right)
-        
-        # Extrai as regiões de borda
-        top_border = frame_rgb[:border_width_v, :]
-        bottom_border = frame_rgb[height - border_width_v:, :]
-        left_border = frame_rgb[:, :border_width_h]
-        right_border = frame_rgb[:, width - border_width_h:]
-        
-        # Calcula as cores médias para cada zona
-        result = {
-            'top': self._calculate_zone_colors(top_border, self.zones_per_side, horizontal=True),
-            'right': self._calculate_zone_colors(right_border, self.zones_per_side, horizontal=False),
-            'bottom': self._calculate_zone_colors(bottom_border, self.zones_per_side, horizontal=True),
-            'left': self._calculate_zone_colors(left_border, self.zones_per_side, horizontal=False)
-        }
+        Permite aplicar uma mudança de zonas ou intensidade sem decodificar um
+        novo frame, e atender sessões com números de zonas diferentes a partir
+        da mesma leitura de pixels.
         
-        # Aplica a intensidade do efeito
-        if self.intensity < 1.0:
-            for side in result:
-                for i, color in enumerate(result[side]):
-                    result[side][i] = [int(c * self.intensity) for c in color]
+        Args:
+            profile: Perfil a usar; por padrão, o do último frame processado
+            
+        Returns:
+            Array uint8 (4, zones_per_side, 3) com as cores [R, G, B], ou None se
+            não houver perfil disponível ou o modo de cor não for 'average'
+        """
+        if self.color_mode != 'average':
+            return None
+        if profile is None:
+            # O último perfil está nos buffers do caminho ao vivo: lido sob o lock,
+            # para que o próximo frame não o altere durante a leitura
+            with self._profile_lock:
+                if self.last_profile is None:
+                    return None
+                return self.last_profile.zones(self.zones_per_side, self.intensity, reuse_buffers=False)
+        # Não escreve nos buffers, que pertencem ao caminho ao vivo
+        return profile.zones(self.zones_per_side, self.intensity, reuse_buffers=False)
+    
+    def _apply_intensity(self, result: np.ndarray) -> np.ndarray:
+        """Aplica a intensidade do efeito às cores em ponto fixo, em uma única operação."""
+        scale = _intensity_scale(self.intensity)
+        if scale < 256:
+            result = ((result.astype(np.uint16) * scale) >> 8).astype(np.uint8)
+        return np.ascontiguousarray(result)
+    
+    def _dominant_zone_array(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Calcula a cor dominante de cada zona, em vez da média.
         
-        # Armazena o resultado para uso em cache
-        self.last_result = result
-        return result
+        As cores são quantizadas em DOMINANT_BITS bits por canal e todas as
+        zonas das quatro bordas são histogramadas com um único np.bincount,
+        usando rótulos (zona, cor quantizada). A cor retornada é a média dos
+        pixels que caíram no pico do histograma de cada zona.
+        
+        Args:
+            frame: Frame (H, W, 3) ou pilha de frames (N, H, W, 3) em BGR
+            
+        Returns:
+            Array uint8 (4, zonas, 3) ou (N, 4, zonas, 3) com as cores [R, G, B]
+        """
+        if frame.ndim == 4:
+            return np.stack([self._dominant_zone_array(f) for f in frame])
+        
+        height, width = frame.shape[:2]
+        num_zones = self.zones_per_side
+        border_width_v, border_width_h = _border_widths(height, width)
+        
+        # Índice da zona de cada coluna (top/bottom) e de cada linha (left/right)
+        x_starts, x_counts = _zone_bounds(width, num_zones)
+        y_starts, y_counts = _zone_bounds(height, num_zones)
+        zone_of_x = np.repeat(np.arange(num_zones), np.diff(np.append(x_starts, width)))
+        zone_of_y = np.repeat(np.arange(num_zones), np.diff(np.append(y_starts, height)))
+        
+        strips = (
+            (frame[:border_width_v], zone_of_x[None, :]),
+            (frame[:, width - border_width_h:], zone_of_y[:, None]),
+            (frame[height - border_width_v:], zone_of_x[None, :]),
+            (frame[:, :border_width_h], zone_of_y[:, None]),
+        )
+        
+        shift = 8 - DOMINANT_BITS
+        num_bins = 1 << (3 * DOMINANT_BITS)
+        labels = []
+        pixels = []
+        for side_index, (strip, zone_index) in enumerate(strips):
+            q = strip >> shift
+            color_bin = q[..., 0].astype(np.int32) << (2 * DOMINANT_BITS)
+            color_bin |= q[..., 1] << DOMINANT_BITS
+            color_bin |= q[..., 2]
+            color_bin += ((side_index * num_zones + zone_index) * num_bins).astype(np.int32)
+            labels.append(color_bin.ravel())
+            pixels.append(strip.reshape(-1, 3))
+        
+        labels = np.concatenate(labels)
+        pixels = np.concatenate(pixels)
+        total_bins = len(SIDES) * num_zones * num_bins
+        
+        histogram = np.bincount(labels, minlength=total_bins).reshape(-1, num_bins)
+        peak = np.arange(len(histogram)) * num_bins + histogram.argmax(axis=1)
+        
+        # Média dos pixels do pico, canal a canal, somando apenas os pixels do pico
+        in_peak = np.zeros(total_bins, dtype=bool)
+        in_peak[peak] = True
+        selected = in_peak[labels]
+        peak_labels = labels[selected]
+        peak_pixels = pixels[selected]
+        sums = np.stack([
+            np.bincount(peak_labels, weights=peak_pixels[:, channel], minlength=total_bins)[peak]
+            for channel in range(3)
+        ], axis=1)
+        
+        # Zonas sem pixels (frames menores que o número de zonas) ficam pretas, sem divisão por zero
+        counts = np.maximum(histogram.ravel()[peak], 1)
+        result = (sums // counts[:, None]).astype(np.uint8)
+        return result.reshape(len(SIDES), num_zones, 3)[..., ::-1]
     
-    def _calculate_zone_colors(self, border: np.ndarray, num_zones: int, horizontal: bool) -> List[List[int]]:
+    def extract_border_colors_batch(self, frames: np.ndarray) -> np.ndarray:
         """
-        Calcula as cores médias para cada zona de uma borda.
+        Extrai as cores das bordas de uma pilha de frames em uma única chamada.
+        
+        Destinado a análise offline e benchmarks: ignora o limite de
+        processing_interval e não altera last_result.
         
         Args:
-            border: Região da borda como numpy array
-            num_zones: Número de zonas a dividir
-            horizontal: Se True, divide horizontalmente, caso contrário, verticalmente
+            frames: Pilha de frames (N, H, W, 3) em BGR, ou sequência de frames
+                de mesmo tamanho
             
         Returns:
-            Lista de cores médias [R, G, B] para cada zona
-        """
-        height, width = border.shape[:2]
-        zone_colors = []
-        
-        if horizontal:
-            # Divide a borda horizontalmente
-            zone_width = width // num_zones
-            for i in range(num_zones):
-                start_x = i * zone_width
-                end_x = start_x + zone_width if i < num_zones - 1 else width
-                zone = border[:, start_x:end_x]
-                avg_color = self._average_color(zone)
-                zone_colors.append(avg_color)
-        else:
-            # Divide a borda verticalmente
-            zone_height = height // num_zones
-            for i in range(num_zones):
-                start_y = i * zone_height
-                end_y = start_y + zone_height if i < num_zones - 1 else height
-                zone = border[start_y:end_y, :]
-                avg_color = self._average_color(zone)
-                zone_colors.append(avg_color)
+            Array uint8 de forma (N, 4, zones_per_side, 3) com as cores [R, G, B]
+        """
+        frames = np.asarray(frames)
+        if frames.ndim != 4:
+            raise ValueError(f"Esperada pilha de frames (N, H, W, 3), recebido formato {frames.shape}")
         
-        return zone_colors
+        return self.compute_zone_array(frames)
     
-    def _average_color(self, region: np.ndarray) -> List[int]:
+    def extract_layout_colors(self, frame: np.ndarray, layouts: Sequence[ZoneLayout]) -> Dict[str, Dict[str, np.ndarray]]:
         """
-        Calcula a cor média de uma região.
+        Extrai as cores de vários layouts de zonas sobre o mesmo frame.
+        
+        Uma única BorderIntegral é construída com a profundidade exigida pelo
+        layout mais profundo, e cada zona de cada layout custa O(1).
         
         Args:
-            region: Região como numpy array
+            frame: Frame do vídeo em formato numpy array (BGR)
+            layouts: Layouts a avaliar
             
         Returns:
-            Cor média [R, G, B]
+            Dicionário nome do layout -> {grupo: array (zonas, 3) uint8 em RGB}
+        """
+        depth = max((layout.depth for layout in layouts), default=0.0)
+        integral = BorderIntegral(self._crop_to_active_area(frame), depth)
+        
+        result = {}
+        for layout in layouts:
+            colors = {}
+            for group, rects in layout.groups.items():
+                colors[group] = self._apply_intensity(integral.mean(rects)[:, ::-1])
+            result[layout.name] = colors
+        return result
+    
+    def _crop_to_active_area(self, frame: np.ndarray) -> np.ndarray:
+        """Recorta o frame (ou pilha de frames) para a área útil, sem copiar pixels."""
+        if self.active_area is None:
+            return frame
+        x0, y0, x1, y1 = self.active_area
+        return frame[..., y0:y1, x0:x1, :]
+    
+    def reset(self) -> None:
+        """Limpa o estado de limitação e o último resultado, como em um processador novo."""
+        self.active_area = None
+        self.last_profile = None
+        self.last_processed_time = 0
+        self._frames_since_calibration = self.calibration_interval
+        if hasattr(self, 'last_result'):
+            del self.last_result
+    
+    def restore_defaults(self) -> None:
+        """Volta as opções de sessão (modo de cor e amostragem) aos valores padrão."""
+        self.set_color_mode('average')
+        self.set_sampling_budget(None)
+    
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
         """
-        avg_color = np.mean(region, axis=(0, 1)).astype(int).tolist()
-        return avg_color
+        Aplica as configurações presentes em um dicionário.
+        
+        Args:
+            settings: Dicionário com zones_per_side, intensity e/ou blur_amount
+        """
+        if 'zones_per_side' in settings:
+            self.set_zones_per_side(int(settings['zones_per_side']))
+        if 'intensity' in settings:
+            self.set_intensity(float(settings['intensity']))
+        if 'blur_amount' in settings:
+            self.set_blur_amount(int(settings['blur_amount']))
+        if 'color_mode' in settings:
+            self.set_color_mode(settings['color_mode'])
+        if 'sampling_error' in settings:
+            self.set_sampling_budget(settings['sampling_error'])
+    
+    def settings(self) -> Dict[str, Any]:
+        """Configurações atuais, no formato aceito por apply_settings."""
+        return {
+            'zones_per_side': self.zones_per_side,
+            'intensity': self.intensity,
+            'blur_amount': self.blur_amount,
+            'color_mode': self.color_mode,
+            'sampling_error': self.sampling_error_budget,
+        }
+    
+    def set_active_area(self, area: Optional[Tuple[int, int, int, int]]) -> None:
+        """
+        Restringe a análise à área útil do vídeo (ver get_active_area).
+        
+        Args:
+            area: Tupla (x0, y0, x1, y1), ou None para usar o frame inteiro
+        """
+        self.active_area = tuple(int(v) for v in area) if area is not None else None
     
     def set_zones_per_side(self, zones: int) -> None:
         """Altera o número de zonas por lado."""
@@ -136,10 +958,216 @@ class AmbilightProcessor:
         """Altera a intensidade do efeito."""
         self.intensity = max(0.0, min(intensity, 1.0))  # Limita entre 0.0 e 1.0
         
+    def set_color_mode(self, mode: str) -> None:
+        """
+        Altera o modo de cálculo da cor das zonas.
+        
+        Args:
+            mode: 'average' (média aritmética) ou 'dominant' (pico do histograma)
+        """
+        if mode not in COLOR_MODES:
+            raise ValueError(f"Modo de cor inválido: {mode}")
+        self.color_mode = mode
+    
+    def set_sampling_budget(self, max_error: Optional[float]) -> None:
+        """
+        Define o erro máximo aceito ao amostrar as bordas de forma espaçada.
+        
+        O processador mede periodicamente o erro de cada passo de amostragem
+        contra a leitura completa e usa o maior passo dentro do orçamento.
+        
+        Args:
+            max_error: Maior diferença por canal (0-255) aceita em qualquer zona,
+                ou None/0 para ler todos os pixels
+        """
+        if not max_error or float(max_error) <= 0:
+            self.sampling_error_budget = None
+            self.sampling_stride = 1
+            self.last_sampling_error = 0.0
+            return
+        self.sampling_error_budget = min(float(max_error), 255.0)
+        # Calibra no próximo frame
+        self._frames_since_calibration = self.calibration_interval
+    
     def set_blur_amount(self, blur: int) -> None:
         """Altera a quantidade de desfoque."""
         self.blur_amount = max(0, min(blur, 50))  # Limita entre 0 e 50
 
+class AdaptiveSampler:
+    """
+    Decide quais frames analisar a partir das mudanças de cena nas bordas.
+    
+    A detecção compara as cores das zonas do último frame analisado com as do
+    anterior, sem reler pixels. Os intervalos são contados em instantes de
+    entrega da taxa de saída (ver PacedCapture), não em frames do arquivo. Em
+    planos estáticos o intervalo entre análises cresce até max_stride; em
+    cortes ou movimento rápido volta para min_stride e permanece assim por
+    hold_frames análises.
+    """
+    
+    def __init__(self, min_stride: int = 1, max_stride: int = 6, cut_threshold: float = 24.0,
+                 motion_threshold: float = 6.0, hold_frames: int = 15):
+        """
+        Inicializa o amostrador.
+        
+        Args:
+            min_stride: Menor intervalo entre análises, em instantes de entrega (taxa máxima)
+            max_stride: Maior intervalo entre análises em planos estáticos, em instantes de entrega
+            cut_threshold: Diferença média (0-255) a partir da qual há um corte de cena
+            motion_threshold: Diferença média a partir da qual há movimento relevante
+            hold_frames: Número de análises em taxa máxima após um corte
+        """
+        self.min_stride = max(1, min_stride)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.cut_threshold = cut_threshold
+        self.motion_threshold = motion_threshold
+        self.hold_frames = hold_frames
+        self.reset()
+    
+    def reset(self) -> None:
+        """Volta ao estado inicial, analisando na taxa máxima."""
+        self.stride = self.min_stride
+        self.frames_since_sample = self.min_stride
+        self.hold = 0
+        self.last_zones: Optional[np.ndarray] = None
+        self.last_score = 0.0
+    
+    def should_sample(self) -> bool:
+        """
+        Indica se o frame do próximo instante de entrega deve ser analisado.
+        
+        Deve ser chamado uma vez por instante de entrega da taxa de saída, e não
+        por frame do vídeo: com o arquivo a 60 fps e saída a 30, max_stride=6
+        significa uma análise a cada 6 entregas (0,2 s de vídeo), não 6 frames.
+        """
+        if self.frames_since_sample >= self.stride:
+            self.frames_since_sample = 1
+            return True
+        self.frames_since_sample += 1
+        return False
+    
+    def update(self, zones: np.ndarray) -> float:
+        """
+        Atualiza o intervalo de amostragem com as cores do frame analisado.
+        
+        Args:
+            zones: Array de cores das zonas (4, zonas, 3)
+            
+        Returns:
+            Pontuação de mudança de cena (diferença média por canal, 0-255)
+        """
+        if self.last_zones is None or self.last_zones.shape != zones.shape:
+            score = self.cut_threshold
+            # Alocados uma vez por formato e reaproveitados a cada frame
+            self.last_zones = zones.copy()
+            self._difference = np.empty(zones.shape, dtype=np.int16)
+        else:
+            np.subtract(zones, self.last_zones, out=self._difference, dtype=np.int16)
+            np.abs(self._difference, out=self._difference)
+            score = float(self._difference.mean())
+            np.copyto(self.last_zones, zones)
+        self.last_score = score
+        
+        if score >= self.cut_threshold:
+            self.stride = self.min_stride
+            self.hold = self.hold_frames
+        elif score >= self.motion_threshold:
+            self.stride = max(self.min_stride, self.stride // 2)
+        elif self.hold > 0:
+            self.hold -= 1
+        else:
+            self.stride = min(self.max_stride, self.stride + 1)
+        
+        return score
+
+
+class ProcessorPool:
+    """
+    Pool de processadores Ambilight, um por sessão de cliente.
+    
+    Cada sessão tem suas próprias configurações e estado de limitação
+    (last_processed_time/last_result). Processadores liberados ficam ociosos
+    e são reaproveitados por novas sessões em vez de serem recriados.
+    """
+    
+    def __init__(self, max_idle: int = 8):
+        """
+        Inicializa o pool.
+        
+        Args:
+            max_idle: Número máximo de processadores ociosos mantidos para reuso
+        """
+        self.max_idle = max_idle
+        self._active: Dict[str, AmbilightProcessor] = {}
+        self._idle: List[AmbilightProcessor] = []
+        self._lock = threading.Lock()
+    
+    def acquire(self, session_id: str, settings: Dict[str, Any] = None) -> AmbilightProcessor:
+        """
+        Obtém o processador de uma sessão, atribuindo um se ainda não houver.
+        
+        Args:
+            session_id: ID da sessão do cliente
+            settings: Configurações iniciais, aplicadas apenas a um processador recém-atribuído
+            
+        Returns:
+            Processador exclusivo da sessão
+        """
+        with self._lock:
+            processor = self._active.get(session_id)
+            if processor is not None:
+                return processor
+            
+            processor = self._idle.pop() if self._idle else AmbilightProcessor()
+            processor.reset()
+            processor.restore_defaults()
+            if settings:
+                processor.apply_settings(settings)
+            self._active[session_id] = processor
+            return processor
+    
+    def get(self, session_id: str) -> Optional[AmbilightProcessor]:
+        """Retorna o processador da sessão, ou None se ela não tiver um."""
+        with self._lock:
+            return self._active.get(session_id)
+    
+    def release(self, session_id: str, reuse: bool = True) -> None:
+        """
+        Devolve o processador de uma sessão ao pool.
+        
+        Args:
+            session_id: ID da sessão do cliente
+            reuse: Se False, o processador é descartado em vez de ficar ocioso;
+                use quando uma tarefa da sessão ainda pode estar usando-o
+        """
+        with self._lock:
+            processor = self._active.pop(session_id, None)
+            if processor is not None and reuse and len(self._idle) < self.max_idle:
+                processor.reset()
+                self._idle.append(processor)
+    
+    def replace(self, session_id: str) -> AmbilightProcessor:
+        """
+        Atribui à sessão um processador novo com as configurações do atual.
+        
+        O processador atual é descartado em vez de ficar ocioso; use quando uma
+        tarefa da sessão que ainda não terminou pode estar usando-o.
+        
+        Args:
+            session_id: ID da sessão do cliente
+            
+        Returns:
+            Novo processador exclusivo da sessão
+        """
+        with self._lock:
+            processor = self._active.pop(session_id, None)
+        return self.acquire(session_id, processor.settings() if processor is not None else None)
+    
+    def __len__(self) -> int:
+        """Número de sessões com processador atribuído."""
+        with self._lock:
+            return len(self._active)
+
 # Função de teste
 def test_processor():
     """Testa o processador com uma imagem simples."""
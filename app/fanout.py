@@ -0,0 +1,297 @@
+"""
+Decodificação compartilhada entre as sessões que assistem ao mesmo vídeo
+"""
+
+import threading
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+import cv2
+
+from app.ambilight import AmbilightProcessor, ColorFrame, get_active_area
+from app.playback import PlaybackClock, PacedCapture
+from app.streaming import ColorBinaryEncoder
+
+
+class VideoProducer:
+    """
+    Decodifica um vídeo uma única vez para as sessões inscritas.
+
+    Cada frame é lido e reduzido a um BorderProfile uma vez; as cores saem
+    desse perfil com as configurações de cada grupo de sessões. Sessões com
+    as mesmas configurações e o mesmo formato de envio (JSON ou binário)
+    ficam na mesma sala do Socket.IO e recebem um único envio por frame.
+
+    O produtor tem o seu próprio relógio; as sessões inscritas são as que
+    estão no mesmo ponto do vídeo (ver FanoutRegistry).
+    """
+
+    def __init__(self, video_path: str, room: str, emit: Callable[[str, Any, str], None],
+                 enter_room: Callable[[str, str], None], leave_room: Callable[[str, str], None],
+                 clock: PlaybackClock = None, output_fps: float = 30.0,
+                 idle: Optional[Callable[[], ContextManager]] = None):
+        """
+        Inicializa o produtor.
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+            room: Prefixo das salas do Socket.IO deste produtor
+            emit: Envia (evento, dados, sala)
+            enter_room: Coloca (sessão, sala)
+            leave_room: Retira (sessão, sala)
+            clock: Relógio de reprodução do produtor
+            output_fps: Cores enviadas por segundo de vídeo
+            idle: Contexto das esperas sem leitura (ver PacedCapture)
+        """
+        self.video_path = video_path
+        self.room = room
+        self.clock = clock or PlaybackClock()
+        self.output_fps = output_fps
+        self.idle = idle
+        self._emit = emit
+        self._enter_room = enter_room
+        self._leave_room = leave_room
+        self._subscribers: Dict[str, Tuple[AmbilightProcessor, bool]] = {}
+        self._rooms: Dict[str, str] = {}
+        self._binary_encoders: Dict[str, ColorBinaryEncoder] = {}
+        # Processadores próprios de cada grupo: os das sessões são apenas lidos
+        self._group_processors: Dict[Tuple[int, float, str], AmbilightProcessor] = {}
+        self._lock = threading.Lock()
+        self.processor = AmbilightProcessor()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def add(self, session_id: str, processor: AmbilightProcessor, binary: bool = False) -> int:
+        """Inscreve uma sessão com o seu processador e retorna o número de inscritos."""
+        with self._lock:
+            self._subscribers[session_id] = (processor, binary)
+            count = len(self._subscribers)
+        # Sala comum do produtor, para avisos a todos os inscritos
+        self._enter_room(session_id, self.room)
+        return count
+
+    def remove(self, session_id: str) -> int:
+        """Remove uma sessão e retorna o número de inscritos restantes."""
+        with self._lock:
+            self._subscribers.pop(session_id, None)
+            room = self._rooms.pop(session_id, None)
+            remaining = len(self._subscribers)
+        if room is not None:
+            self._leave_room(session_id, room)
+        self._leave_room(session_id, self.room)
+        return remaining
+
+    def subscriber(self, session_id: str) -> Optional[Tuple[AmbilightProcessor, bool]]:
+        """Processador e formato de envio de uma sessão inscrita."""
+        with self._lock:
+            return self._subscribers.get(session_id)
+
+    def _group_room(self, settings: Tuple[int, float, str], binary: bool) -> str:
+        """Sala das sessões com as mesmas configurações de cor e formato de envio."""
+        room = f"{self.room}:{settings[0]}:{settings[1]:g}:{settings[2]}"
+        return f"{room}:bin" if binary else room
+
+    def _groups(self) -> Dict[str, Tuple[Tuple[int, float, str], bool]]:
+        """Agrupa os inscritos por configurações, atualizando as salas de quem mudou."""
+        moves = []
+        groups = {}
+        with self._lock:
+            for session_id, (processor, binary) in self._subscribers.items():
+                settings = (processor.zones_per_side, processor.intensity, processor.color_mode)
+                room = self._group_room(settings, binary)
+                groups.setdefault(room, (settings, binary))
+                if self._rooms.get(session_id) != room:
+                    moves.append((session_id, self._rooms.get(session_id), room))
+                    self._rooms[session_id] = room
+
+        for session_id, old_room, new_room in moves:
+            if old_room is not None:
+                self._leave_room(session_id, old_room)
+            self._enter_room(session_id, new_room)
+
+        # Salas vazias perdem o codificador; se voltarem a ser usadas, começam um novo fluxo
+        for room in [room for room in self._binary_encoders if room not in groups]:
+            del self._binary_encoders[room]
+        # Processadores de configurações que nenhum inscrito usa mais (ex.: intensidades antigas)
+        in_use = {settings for settings, _ in groups.values()}
+        for settings in [settings for settings in self._group_processors if settings not in in_use]:
+            del self._group_processors[settings]
+        return groups
+
+    def _group_processor(self, settings: Tuple[int, float, str]) -> AmbilightProcessor:
+        """Processador do produtor para um grupo de configurações."""
+        processor = self._group_processors.get(settings)
+        if processor is None:
+            processor = AmbilightProcessor(zones_per_side=settings[0], intensity=settings[1])
+            processor.set_color_mode(settings[2])
+            processor.set_active_area(self.processor.active_area)
+            self._group_processors[settings] = processor
+        return processor
+
+    def run(self, stop_event: threading.Event) -> None:
+        """
+        Decodifica o vídeo e envia as cores até stop_event ser sinalizado.
+
+        Args:
+            stop_event: Evento que encerra o produtor
+        """
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if not cap.isOpened():
+                self._emit('error', {'message': 'Não foi possível abrir o vídeo'}, self.room)
+                return
+
+            self.processor.set_active_area(get_active_area(self.video_path))
+
+            capture = PacedCapture(cap, self.clock, output_fps=self.output_fps, idle=self.idle)
+            for frame, pts in capture.frames(stop_event):
+                try:
+                    # Os pixels das bordas são lidos uma única vez para todos os inscritos,
+                    # nos buffers do produtor: os grupos só leem o perfil
+                    profile = self.processor.compute_profile(frame, reuse_buffers=True)
+                    for room, (settings, binary) in self._groups().items():
+                        processor = self._group_processor(settings)
+                        zones = processor.zones_from_profile(profile)
+                        if zones is None:
+                            # Modos sem perfil (cor dominante) leem o frame
+                            zones = processor.compute_zone_array(frame)
+                        if binary:
+                            encoder = self._binary_encoders.setdefault(room, ColorBinaryEncoder())
+                            self._emit(*encoder.encode(zones, pts), room)
+                        else:
+                            self._emit('colors', ColorFrame(zones).to_dict(), room)
+                except Exception as e:
+                    print(f"Erro ao processar frame compartilhado: {e}")
+        finally:
+            cap.release()
+
+
+class FanoutRegistry:
+    """
+    Produtores compartilhados por vídeo, iniciados e parados por contagem de inscritos.
+
+    Cada sessão mantém o seu próprio relógio. Ela só é inscrita em um produtor
+    cujo relógio esteja no mesmo ponto do vídeo (mesmo estado, velocidade e
+    instante dentro da tolerância); caso contrário, recebe um produtor novo.
+    Os eventos de reprodução de uma sessão nunca movem o relógio de outras:
+    uma sessão sozinha no seu produtor o conduz, e uma sessão que se afasta
+    do seu produtor passa para outro.
+    """
+
+    def __init__(self, start: Callable[[VideoProducer], Any],
+                 create: Callable[[str, PlaybackClock], VideoProducer], tolerance: float = 1.0):
+        """
+        Inicializa o registro.
+
+        Args:
+            start: Inicia um produtor e retorna uma referência com cancel() (ex.: TaskHandle)
+            create: Cria o produtor de um caminho de vídeo com o relógio dado
+            tolerance: Distância máxima em segundos entre o relógio de uma sessão e o do seu produtor
+        """
+        self._start = start
+        self._create = create
+        self.tolerance = tolerance
+        self._producers: Dict[str, List[Tuple[VideoProducer, Any]]] = {}
+        self._sessions: Dict[str, Tuple[VideoProducer, PlaybackClock]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, video_path: str, session_id: str, processor: AmbilightProcessor,
+                  clock: PlaybackClock, binary: bool = False) -> VideoProducer:
+        """
+        Inscreve uma sessão em um produtor do vídeo no mesmo ponto que o seu relógio,
+        iniciando um novo se não houver.
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+            session_id: ID da sessão
+            processor: Processador com as configurações da sessão
+            clock: Relógio de reprodução da sessão
+            binary: Se a sessão recebe as cores em mensagens binárias
+
+        Returns:
+            Produtor em que a sessão foi inscrita
+
+        Raises:
+            Exception: O que start levantar ao iniciar um novo produtor (ex.: SchedulerFull)
+        """
+        self.unsubscribe(session_id)
+        with self._lock:
+            entries = self._producers.setdefault(video_path, [])
+            producer = next((producer for producer, _ in entries
+                             if producer.clock.close_to(clock, self.tolerance)), None)
+            if producer is None:
+                producer = self._create(video_path, clock.copy())
+                try:
+                    entries.append((producer, self._start(producer)))
+                except Exception:
+                    if not entries:
+                        del self._producers[video_path]
+                    raise
+            producer.add(session_id, processor, binary)
+            self._sessions[session_id] = (producer, clock)
+        return producer
+
+    def unsubscribe(self, session_id: str) -> None:
+        """Remove a inscrição de uma sessão, parando o produtor se ela era a última."""
+        with self._lock:
+            producer, _ = self._sessions.pop(session_id, (None, None))
+            if producer is None or producer.remove(session_id) > 0:
+                return
+            entries = self._producers.get(producer.video_path, [])
+            task = next((task for entry, task in entries if entry is producer), None)
+            entries[:] = [entry for entry in entries if entry[0] is not producer]
+            if not entries:
+                self._producers.pop(producer.video_path, None)
+        if task is not None:
+            task.cancel()
+
+    def report(self, session_id: str, event: str, media_time: Optional[float] = None,
+               rate: Optional[float] = None) -> Optional[VideoProducer]:
+        """
+        Acompanha um evento de reprodução já aplicado ao relógio da sessão.
+
+        Com outros inscritos, a sessão continua no produtor se ainda estiver no
+        mesmo ponto do vídeo; senão, passa para outro produtor. Uma sessão
+        sozinha no seu produtor passa para outro que esteja no mesmo ponto, se
+        houver, ou aplica o evento também ao relógio do seu.
+
+        Args:
+            session_id: ID da sessão
+            event: Um de PLAYBACK_EVENTS
+            media_time: Instante do vídeo no cliente em segundos
+            rate: Velocidade de reprodução no cliente
+
+        Returns:
+            Produtor da sessão após o evento, ou None se ela não estiver inscrita
+
+        Raises:
+            Exception: O que start levantar ao iniciar um novo produtor (ex.: SchedulerFull)
+        """
+        with self._lock:
+            producer, clock = self._sessions.get(session_id, (None, None))
+            if producer is None:
+                return None
+            if producer.clock.close_to(clock, self.tolerance) and len(producer) > 1:
+                return producer
+            # Sozinha no produtor: passa para outro no mesmo ponto, se houver, ou conduz o seu
+            alone = len(producer) == 1
+            if alone and not any(other is not producer and other.clock.close_to(clock, self.tolerance)
+                                 for other, _ in self._producers.get(producer.video_path, [])):
+                producer.clock.report(event, media_time, rate)
+                return producer
+            subscriber = producer.subscriber(session_id)
+
+        processor, binary = subscriber
+        # Ao sair, o produtor antigo é parado se ficar sem inscritos
+        return self.subscribe(producer.video_path, session_id, processor, clock, binary)
+
+    def producer_for(self, session_id: str) -> Optional[VideoProducer]:
+        """Produtor em que a sessão está inscrita, se houver."""
+        with self._lock:
+            return self._sessions.get(session_id, (None, None))[0]
+
+    def stats(self) -> Dict[str, List[int]]:
+        """Número de inscritos de cada produtor, por vídeo."""
+        with self._lock:
+            return {path: [len(producer) for producer, _ in entries] for path, entries in self._producers.items()}
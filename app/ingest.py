@@ -0,0 +1,165 @@
+"""
+Preparação de vídeos em segundo plano após o upload para o Ambilight Player
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional
+
+from app.scheduler import TaskScheduler, SchedulerFull, PRIORITY_BACKGROUND
+
+# Estados de um estágio
+STAGE_PENDING = 'pending'
+STAGE_RUNNING = 'running'
+STAGE_DONE = 'done'
+STAGE_ERROR = 'error'
+STAGE_SKIPPED = 'skipped'
+
+
+class IngestPipeline:
+    """
+    Executa os estágios de preparação de cada vídeo enviado.
+
+    Cada estágio é uma função que recebe o caminho do vídeo e devolve um
+    dicionário serializável em JSON. Estágios independentes rodam ao mesmo
+    tempo, como tarefas de segundo plano do agendador; um estágio só começa
+    depois dos estágios de que depende, e é ignorado se algum deles falhar.
+    """
+
+    def __init__(self, scheduler: TaskScheduler, max_jobs: int = 100):
+        """
+        Inicializa o pipeline.
+
+        Args:
+            scheduler: Agendador que executa os estágios
+            max_jobs: Número de trabalhos mantidos para consulta de situação
+        """
+        self.scheduler = scheduler
+        self.max_jobs = max_jobs
+        self._stages: Dict[str, Dict[str, Any]] = OrderedDict()
+        self._jobs: Dict[str, Dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, func: Callable[[str], Dict[str, Any]], after: Optional[List[str]] = None) -> None:
+        """
+        Registra um estágio.
+
+        Args:
+            name: Nome do estágio
+            func: Função que recebe o caminho do vídeo e devolve o resultado
+            after: Estágios que precisam terminar antes deste
+
+        Raises:
+            ValueError: Se algum estágio de que depende não estiver registrado
+        """
+        after = list(after or [])
+        missing = [stage for stage in after if stage not in self._stages]
+        if missing:
+            raise ValueError(f"Estágios desconhecidos: {', '.join(missing)}")
+        self._stages[name] = {'func': func, 'after': after}
+
+    def submit(self, video_path: str) -> str:
+        """
+        Inicia a preparação de um vídeo, substituindo a situação de um envio anterior.
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+
+        Returns:
+            Identificador do trabalho (nome do arquivo)
+        """
+        job_id = os.path.basename(video_path)
+        job = {
+            'path': video_path,
+            'submitted': time.time(),
+            'stages': {name: {'status': STAGE_PENDING} for name in self._stages},
+        }
+
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            ready = self._ready_stages(job)
+
+        self._schedule(job, ready)
+        return job_id
+
+    def _ready_stages(self, job: Dict[str, Any]) -> List[str]:
+        """
+        Marca como em execução os estágios pendentes cujas dependências terminaram,
+        e como ignorados os que dependem de estágios com falha. Exige o lock.
+        """
+        stages = job['stages']
+        ready = []
+        changed = True
+        while changed:
+            changed = False
+            for name, stage in self._stages.items():
+                if stages[name]['status'] != STAGE_PENDING:
+                    continue
+                after = [stages[dependency]['status'] for dependency in stage['after']]
+                if any(status in (STAGE_ERROR, STAGE_SKIPPED) for status in after):
+                    stages[name]['status'] = STAGE_SKIPPED
+                    changed = True
+                elif all(status == STAGE_DONE for status in after):
+                    stages[name]['status'] = STAGE_RUNNING
+                    ready.append(name)
+        return ready
+
+    def _run_stage(self, job: Dict[str, Any], name: str) -> None:
+        """Executa um estágio e agenda os que passaram a estar prontos."""
+        start_time = time.time()
+        try:
+            result = self._stages[name]['func'](job['path'])
+            outcome = {'status': STAGE_DONE, 'result': result or {}}
+        except Exception as e:
+            print(f"Erro no estágio {name} de {job['path']}: {e}")
+            outcome = {'status': STAGE_ERROR, 'error': str(e)}
+        outcome['elapsed'] = round(time.time() - start_time, 3)
+
+        with self._lock:
+            job['stages'][name] = outcome
+            ready = self._ready_stages(job)
+
+        self._schedule(job, ready)
+
+    def _schedule(self, job: Dict[str, Any], names: List[str]) -> None:
+        """Agenda estágios prontos; um estágio recusado pelo agendador é marcado com falha."""
+        for name in names:
+            try:
+                self.scheduler.submit(self._run_stage, job, name, priority=PRIORITY_BACKGROUND,
+                                      name=f"ingest:{name}:{os.path.basename(job['path'])}")
+            except SchedulerFull as e:
+                with self._lock:
+                    job['stages'][name] = {'status': STAGE_ERROR, 'error': str(e)}
+                    ready = self._ready_stages(job)
+                self._schedule(job, ready)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Situação da preparação de um vídeo.
+
+        Args:
+            job_id: Identificador do trabalho (nome do arquivo)
+
+        Returns:
+            Dicionário com a situação geral e a de cada estágio, ou None se desconhecido
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            stages = {name: dict(stage) for name, stage in job['stages'].items()}
+
+        statuses = {stage['status'] for stage in stages.values()}
+        if statuses & {STAGE_PENDING, STAGE_RUNNING}:
+            state = STAGE_RUNNING
+        elif statuses & {STAGE_ERROR, STAGE_SKIPPED}:
+            state = STAGE_ERROR
+        else:
+            state = STAGE_DONE
+
+        return {'status': state, 'submitted': job['submitted'], 'stages': stages}
@@ -5,6 +5,7 @@ Modelos de dados para o Ambilight Player
 import sqlite3
 import os
 import json
+import time
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Union, Tuple
 
@@ -63,6 +64,28 @@ class DatabaseManager:
         )
         ''')
         
+        # Cria tabela de metadados dos vídeos se não existir
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS videos (
+            path TEXT PRIMARY KEY,
+            filename TEXT,
+            size INTEGER,
+            mtime REAL,
+            width INTEGER,
+            height INTEGER,
+            fps REAL,
+            frame_count INTEGER,
+            duration REAL,
+            codec TEXT,
+            probe_error TEXT
+        )
+        ''')
+        # Bancos criados antes da coluna probe_error
+        c.execute("PRAGMA table_info(videos)")
+        if 'probe_error' not in [row[1] for row in c.fetchall()]:
+            c.execute("ALTER TABLE videos ADD COLUMN probe_error TEXT")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_videos_mtime ON videos (mtime DESC)")
+        
         # Verifica se já existem configurações padrão
         c.execute("SELECT COUNT(*) FROM settings")
         if c.fetchone()[0] == 0:
@@ -317,4 +340,202 @@ class History:
             return True
         except Exception as e:
             print(f"Erro ao limpar histórico: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+class VideoMetadata:
+    """
+    Modelo para os metadados dos vídeos da biblioteca.
+    
+    Cada vídeo é lido uma única vez; o registro é refeito apenas quando o
+    tamanho ou a data de modificação do arquivo mudam. Vídeos que não podem
+    ser abertos também são registrados, com os metadados nulos e o erro em
+    probe_error, para continuarem na listagem sem serem lidos de novo.
+    """
+    
+    def __init__(self, db_manager: DatabaseManager, recheck_interval: float = 60.0):
+        """
+        Inicializa o modelo de metadados.
+        
+        Args:
+            db_manager: Gerenciador de banco de dados
+            recheck_interval: Intervalo mínimo em segundos entre verificações
+                dos arquivos já registrados de um diretório
+        """
+        self.db_manager = db_manager
+        self.recheck_interval = recheck_interval
+        # Data de modificação de cada diretório na última listagem
+        self._synced_directories: Dict[str, float] = {}
+        # Instante da última verificação dos arquivos de cada diretório
+        self._checked_directories: Dict[str, float] = {}
+    
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtém o registro de um vídeo.
+        
+        Args:
+            path: Caminho do arquivo
+            
+        Returns:
+            Dicionário com os metadados, ou None se o vídeo não estiver registrado
+        """
+        conn = self.db_manager.get_connection()
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        
+        c.execute("SELECT * FROM videos WHERE path = ?", (path,))
+        row = c.fetchone()
+        
+        conn.close()
+        return dict(row) if row else None
+    
+    def refresh(self, path: str, force: bool = False) -> Dict[str, Any]:
+        """
+        Obtém os metadados de um vídeo, lendo o arquivo apenas se o registro estiver desatualizado.
+        
+        Um vídeo que não pode ser aberto fica registrado com o erro; enquanto o
+        arquivo não mudar, o erro registrado é levantado sem abri-lo de novo.
+        
+        Args:
+            path: Caminho do arquivo
+            force: Lê o arquivo mesmo com o registro atualizado
+            
+        Returns:
+            Dicionário com os metadados
+            
+        Raises:
+            OSError: Se o arquivo não existir
+            ValueError: Se o vídeo não puder ser aberto
+        """
+        from app.utils import get_video_metadata
+        
+        stats = os.stat(path)
+        record = self.get(path)
+        if record and not force and record['size'] == stats.st_size and record['mtime'] == stats.st_mtime:
+            if record['probe_error']:
+                raise ValueError(record['probe_error'])
+            return record
+        
+        record = {
+            'path': path,
+            'filename': os.path.basename(path),
+            'size': stats.st_size,
+            'mtime': stats.st_mtime,
+            'width': None,
+            'height': None,
+            'fps': None,
+            'frame_count': None,
+            'duration': None,
+            'codec': None,
+            'probe_error': None
+        }
+        try:
+            record.update(get_video_metadata(path))
+        except ValueError as e:
+            record['probe_error'] = str(e)
+        
+        conn = self.db_manager.get_connection()
+        c = conn.cursor()
+        c.execute("""
+        INSERT OR REPLACE INTO videos (path, filename, size, mtime, width, height, fps, frame_count, duration, codec, probe_error)
+        VALUES (:path, :filename, :size, :mtime, :width, :height, :fps, :frame_count, :duration, :codec, :probe_error)
+        """, record)
+        conn.commit()
+        conn.close()
+        
+        if record['probe_error']:
+            raise ValueError(record['probe_error'])
+        return record
+    
+    def sync(self, directory: str, supported_extensions: List[str]) -> bool:
+        """
+        Sincroniza os registros com os arquivos de um diretório.
+        
+        Na maior parte das chamadas, custa apenas um os.stat do diretório. Ele
+        só é listado quando a sua data de modificação muda, isto é, quando
+        arquivos são adicionados, removidos ou renomeados. Arquivos sobrescritos
+        no lugar não mudam o diretório: os já registrados são verificados com
+        os.stat no máximo uma vez a cada recheck_interval segundos (os enviados
+        pela aplicação são relidos na preparação, por refresh).
+        
+        Args:
+            directory: Diretório dos vídeos
+            supported_extensions: Lista de extensões suportadas
+            
+        Returns:
+            True se algum registro foi criado, atualizado ou removido
+        """
+        try:
+            directory_mtime = os.stat(directory).st_mtime
+        except OSError:
+            return False
+        
+        now = time.monotonic()
+        listed = self._synced_directories.get(directory) != directory_mtime
+        checked_at = self._checked_directories.get(directory)
+        if not listed and checked_at is not None and now - checked_at < self.recheck_interval:
+            return False
+        
+        conn = self.db_manager.get_connection()
+        c = conn.cursor()
+        c.execute("SELECT path, size, mtime FROM videos WHERE path LIKE ?", (os.path.join(directory, '%'),))
+        registered = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+        conn.close()
+        
+        if listed:
+            candidates = [
+                os.path.join(directory, filename) for filename in os.listdir(directory)
+                if any(filename.lower().endswith(f".{ext}") for ext in supported_extensions)
+            ]
+        else:
+            candidates = list(registered)
+        
+        changed = False
+        present = set()
+        for path in candidates:
+            try:
+                stats = os.stat(path)
+            except OSError:
+                continue
+            if not os.path.isfile(path):
+                continue
+            present.add(path)
+            if registered.get(path) == (stats.st_size, stats.st_mtime):
+                continue
+            # Mesmo um vídeo que não abre é registrado e não é lido de novo
+            changed = True
+            try:
+                self.refresh(path)
+            except (OSError, ValueError) as e:
+                print(f"Erro ao ler metadados de {path}: {e}")
+        
+        # Remove registros de arquivos que não existem mais no diretório
+        removed = [(path,) for path in registered if path not in present]
+        if removed:
+            conn = self.db_manager.get_connection()
+            c = conn.cursor()
+            c.executemany("DELETE FROM videos WHERE path = ?", removed)
+            conn.commit()
+            conn.close()
+            changed = True
+        
+        self._synced_directories[directory] = directory_mtime
+        self._checked_directories[directory] = now
+        return changed
+    
+    def list_all(self) -> List[Dict[str, Any]]:
+        """
+        Lista os vídeos registrados, do modificado mais recentemente ao mais antigo.
+        
+        Returns:
+            Lista de dicionários com os metadados
+        """
+        conn = self.db_manager.get_connection()
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        
+        c.execute("SELECT * FROM videos ORDER BY mtime DESC")
+        result = [dict(row) for row in c.fetchall()]
+        
+        conn.close()
+        return result
@@ -0,0 +1,341 @@
+"""
+Sincronização com a reprodução do vídeo no cliente do Ambilight Player
+"""
+
+import time
+import threading
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Eventos de reprodução informados pelo cliente
+PLAYBACK_EVENTS = ('play', 'pause', 'seek', 'rate')
+
+
+class PlaybackClock:
+    """
+    Relógio de mídia de uma sessão, guiado pelos eventos do <video> do cliente.
+
+    Guarda o último instante informado (âncora) e o momento em que foi
+    recebido; durante a reprodução, o instante atual é extrapolado a partir
+    dele com a velocidade de reprodução. Cada salto (seek) incrementa a
+    versão, para que quem consome o relógio saiba que deve se reposicionar.
+    """
+
+    def __init__(self, media_time: float = 0.0, playing: bool = True, rate: float = 1.0):
+        """
+        Inicializa o relógio.
+
+        Args:
+            media_time: Instante inicial do vídeo em segundos
+            playing: Se o vídeo já está em reprodução
+            rate: Velocidade de reprodução
+        """
+        self._condition = threading.Condition()
+        self._anchor_media = max(0.0, float(media_time))
+        self._anchor_wall = time.monotonic()
+        self._playing = bool(playing)
+        self._rate = self._valid_rate(rate)
+        self.version = 0
+        # Se o cliente já informou algum evento; sem isso o vídeo é tratado como em loop
+        self.synced = False
+
+    @staticmethod
+    def _valid_rate(rate: float) -> float:
+        """Limita a velocidade de reprodução a um intervalo razoável."""
+        return max(0.0625, min(float(rate), 16.0))
+
+    def _media_time_locked(self) -> float:
+        """Instante atual do vídeo; exige o lock."""
+        if not self._playing:
+            return self._anchor_media
+        return self._anchor_media + (time.monotonic() - self._anchor_wall) * self._rate
+
+    def _update(self, media_time: Optional[float] = None, playing: Optional[bool] = None,
+                rate: Optional[float] = None, seek: bool = False) -> None:
+        """Reancora o relógio e acorda quem estiver esperando por mudanças."""
+        with self._condition:
+            self._anchor_media = max(0.0, float(media_time)) if media_time is not None else self._media_time_locked()
+            self._anchor_wall = time.monotonic()
+            if playing is not None:
+                self._playing = playing
+            if rate is not None:
+                self._rate = self._valid_rate(rate)
+            if seek:
+                self.version += 1
+            self._condition.notify_all()
+
+    @property
+    def playing(self) -> bool:
+        """Se o vídeo está em reprodução."""
+        with self._condition:
+            return self._playing
+
+    @property
+    def rate(self) -> float:
+        """Velocidade de reprodução."""
+        with self._condition:
+            return self._rate
+
+    def media_time(self) -> float:
+        """Instante atual do vídeo em segundos."""
+        with self._condition:
+            return self._media_time_locked()
+
+    def snapshot(self) -> Tuple[int, bool, float, float]:
+        """
+        Estado consistente do relógio.
+
+        Returns:
+            Tupla (versão, em reprodução, instante atual, velocidade)
+        """
+        with self._condition:
+            return self.version, self._playing, self._media_time_locked(), self._rate
+
+    def copy(self) -> 'PlaybackClock':
+        """Novo relógio no mesmo estado, que passa a andar de forma independente."""
+        _, playing, media_time, rate = self.snapshot()
+        clock = PlaybackClock(media_time, playing, rate)
+        clock.synced = self.synced
+        return clock
+
+    def close_to(self, other: 'PlaybackClock', tolerance: float) -> bool:
+        """
+        Se dois relógios mostram o mesmo ponto do vídeo.
+
+        Args:
+            other: Relógio a comparar
+            tolerance: Distância máxima em segundos entre os instantes
+
+        Returns:
+            True se ambos estão no mesmo estado de reprodução e velocidade, a
+            no máximo tolerance segundos um do outro
+        """
+        _, playing, media_time, rate = self.snapshot()
+        _, other_playing, other_media_time, other_rate = other.snapshot()
+        return playing == other_playing and rate == other_rate and abs(media_time - other_media_time) <= tolerance
+
+    def play(self, media_time: Optional[float] = None) -> None:
+        """Retoma a reprodução, opcionalmente a partir do instante dado."""
+        self._update(media_time, playing=True)
+
+    def pause(self, media_time: Optional[float] = None) -> None:
+        """Pausa a reprodução, opcionalmente no instante dado."""
+        self._update(media_time, playing=False)
+
+    def seek(self, media_time: float) -> None:
+        """Salta para o instante dado, mantendo o estado de reprodução."""
+        self._update(media_time, seek=True)
+
+    def set_rate(self, rate: float, media_time: Optional[float] = None) -> None:
+        """Altera a velocidade de reprodução."""
+        self._update(media_time, rate=rate)
+
+    def report(self, event: str, media_time: Optional[float] = None, rate: Optional[float] = None) -> None:
+        """
+        Aplica um evento de reprodução informado pelo cliente.
+
+        Args:
+            event: Um de PLAYBACK_EVENTS
+            media_time: Instante do vídeo no cliente em segundos
+            rate: Velocidade de reprodução no cliente
+
+        Raises:
+            ValueError: Se o evento ou os valores forem inválidos
+        """
+        if event not in PLAYBACK_EVENTS:
+            raise ValueError(f"Evento de reprodução inválido: {event}")
+        media_time = float(media_time) if media_time is not None else None
+        rate = float(rate) if rate is not None else None
+
+        self.synced = True
+        if rate is not None and rate != self.rate:
+            self.set_rate(rate, media_time)
+        if event == 'play':
+            self.play(media_time)
+        elif event == 'pause':
+            self.pause(media_time)
+        elif event == 'seek':
+            self.seek(media_time if media_time is not None else self.media_time())
+
+    def wait(self, timeout: float) -> None:
+        """Espera até o tempo dado ou até a próxima mudança no relógio."""
+        with self._condition:
+            self._condition.wait(max(0.0, timeout))
+
+    def wake(self) -> None:
+        """Acorda quem estiver esperando, por exemplo para que perceba uma parada."""
+        with self._condition:
+            self._condition.notify_all()
+
+
+class PacedCapture:
+    """
+    Lê um vídeo no ritmo de um PlaybackClock, entregando só os frames a analisar.
+
+    A posição vem do instante de cada frame (CAP_PROP_POS_MSEC) e do fps de
+    origem, não do tempo gasto na decodificação. Os frames são entregues a uma
+    taxa de saída fixa em tempo de mídia, independente do fps do arquivo; os
+    demais são apenas avançados, sem conversão para imagem. Quando a leitura
+    fica atrasada em relação ao relógio, os frames atrasados são pulados e o
+    atraso é informado. Com o vídeo pausado ou no fim, a espera acontece
+    dentro de idle(), por exemplo TaskScheduler.idle, para não ocupar uma
+    vaga de processamento.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, clock: PlaybackClock, output_fps: float = 30.0,
+                 sync_tolerance: float = 1.0, max_wait: float = 0.1, idle_wait: float = 0.5,
+                 lag_threshold: float = 0.25, report_interval: float = 2.0,
+                 idle: Optional[Callable[[], ContextManager]] = None):
+        """
+        Inicializa a leitura.
+
+        Args:
+            cap: Captura de vídeo já aberta
+            clock: Relógio de reprodução da sessão
+            output_fps: Frames entregues por segundo de vídeo (limitado ao fps de origem)
+            sync_tolerance: Distância em segundos a partir da qual a leitura é reposicionada
+            max_wait: Espera máxima entre frames durante a reprodução
+            idle_wait: Espera entre verificações com o vídeo pausado ou no fim
+            lag_threshold: Atraso em segundos considerado relevante
+            report_interval: Intervalo mínimo em segundos entre avisos de atraso
+            idle: Fábrica do contexto das esperas sem leitura (pausa e fim do vídeo)
+        """
+        self.cap = cap
+        self.clock = clock
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.source_fps = fps if fps and fps > 0 else 30.0
+        self.frame_time = 1.0 / self.source_fps
+        self.output_interval = max(1.0 / output_fps, self.frame_time) if output_fps > 0 else self.frame_time
+        self.sync_tolerance = sync_tolerance
+        self.max_wait = max_wait
+        self.idle_wait = idle_wait
+        self.lag_threshold = lag_threshold
+        self.report_interval = report_interval
+        self.idle = idle or nullcontext
+
+        # Instante do próximo frame a ler e do próximo frame a entregar
+        self.position = 0.0
+        self.next_output = 0.0
+        self.lag = 0.0
+        self.delivered = 0
+        self.dropped = 0
+        self._behind_since: Optional[float] = None
+        self._last_report = 0.0
+
+    def _seek(self, media_time: float) -> None:
+        """Reposiciona a leitura no instante dado."""
+        self.cap.set(cv2.CAP_PROP_POS_MSEC, media_time * 1000.0)
+        self.position = media_time
+        self.next_output = media_time
+
+    def _advance(self, decode: bool) -> Tuple[bool, Optional[np.ndarray], float]:
+        """Lê o próximo frame, decodificando-o em imagem apenas se pedido."""
+        if decode:
+            ret, frame = self.cap.read()
+        else:
+            ret, frame = self.cap.grab(), None
+        if not ret:
+            return False, None, self.position
+
+        pts = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        # Alguns backends não informam o instante dos frames: usa o fps de origem
+        if pts <= 0.0 and self.position > 0.0:
+            pts = self.position
+        self.position = pts + self.frame_time
+        return True, frame, pts
+
+    def _consume_output_slot(self, frame_time: float) -> None:
+        """Avança para o próximo instante de entrega, contando os perdidos no atraso."""
+        if self.next_output < frame_time - self.output_interval:
+            self.dropped += int((frame_time - self.next_output) / self.output_interval)
+            self.next_output = frame_time
+        self.next_output += self.output_interval
+
+    def _track_lag(self, lag: float, on_lag: Optional[Callable[[float, int], None]]) -> None:
+        """Informa o atraso quando ele persiste por mais de um segundo."""
+        self.lag = lag
+        if lag < self.lag_threshold:
+            self._behind_since = None
+            return
+
+        now = time.monotonic()
+        if self._behind_since is None:
+            self._behind_since = now
+        elif now - self._behind_since >= 1.0 and now - self._last_report >= self.report_interval:
+            self._last_report = now
+            if on_lag is not None:
+                on_lag(lag, self.dropped)
+
+    def _wait_idle(self, stop_event: threading.Event, version: int, playing: bool) -> None:
+        """Espera sem ler até um salto, até o vídeo pausar ou voltar a tocar ou até a parada."""
+        with self.idle():
+            while not stop_event.is_set() and self.clock.snapshot()[:2] == (version, playing):
+                self.clock.wait(self.idle_wait)
+
+    def frames(self, stop_event: threading.Event, sampler=None,
+               on_lag: Optional[Callable[[float, int], None]] = None) -> Iterator[Tuple[np.ndarray, float]]:
+        """
+        Entrega os frames a analisar, no ritmo do relógio.
+
+        Args:
+            stop_event: Evento que encerra a leitura
+            sampler: AdaptiveSampler opcional, consultado a cada instante de entrega
+            on_lag: Chamado com (atraso em segundos, frames perdidos) quando a leitura fica para trás
+
+        Yields:
+            Tuplas (frame BGR, instante do frame em segundos)
+        """
+        seen_version = None
+        show_frame = False
+        while not stop_event.is_set():
+            version, playing, media_time, rate = self.clock.snapshot()
+            drift = media_time - self.position
+
+            # Reposiciona em saltos ou quando a leitura se afasta demais do cliente
+            if version != seen_version or abs(drift) > self.sync_tolerance:
+                self._seek(media_time)
+                seen_version = version
+                if sampler is not None:
+                    sampler.reset()
+                show_frame = True
+                continue
+
+            if not playing and not show_frame:
+                self._wait_idle(stop_event, version, playing)
+                continue
+
+            # O próximo frame ainda não é exibido pelo cliente
+            if playing and drift < 0:
+                self.clock.wait(min(-drift / rate, self.max_wait))
+                continue
+
+            # Frames já atrasados são apenas avançados; as entregas que eles ocupariam são perdidas
+            behind = playing and drift >= self.frame_time
+            self._track_lag(drift if behind else 0.0, on_lag)
+
+            sample = show_frame
+            frame_time = self.position
+            if frame_time + self.frame_time / 2 >= self.next_output:
+                self._consume_output_slot(frame_time)
+                if behind:
+                    self.dropped += 1
+                else:
+                    sample = sample or sampler is None or sampler.should_sample()
+
+            ret, frame, pts = self._advance(decode=sample)
+            if not ret:
+                if self.clock.synced:
+                    # Fim do vídeo: espera um salto ou uma nova reprodução
+                    self._wait_idle(stop_event, seen_version, playing)
+                else:
+                    # Reinicia o vídeo ao final
+                    self.clock.seek(0.0)
+                continue
+
+            if sample:
+                show_frame = False
+                self.delivered += 1
+                yield frame, pts
@@ -6,6 +6,7 @@ import re
 import cv2
 import numpy as np
 import threading
+import itertools
 import time
 from werkzeug.utils import secure_filename
 from datetime import datetime
@@ -16,9 +17,17 @@ from flask import Response
 import mimetypes
 
 
-from app.ambilight import AmbilightProcessor
-from app.models import DatabaseManager, Settings, History
-from app.utils import list_supported_videos, sanitize_filename, create_directory_if_not_exists, is_video_format_supported
+from app.ambilight import ProcessorPool, AdaptiveSampler, ColorFrame, get_active_area, zones_to_dict
+from app.streaming import ColorDeltaEncoder, ColorBinaryEncoder
+from app.playback import PlaybackClock, PacedCapture
+from app.fanout import VideoProducer, FanoutRegistry
+from app.tracks import ColorTrackCache, analyze_video
+from app.ingest import IngestPipeline
+from app.scheduler import TaskScheduler, SchedulerFull, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from app.models import DatabaseManager, Settings, History, VideoMetadata
+from app.utils import sanitize_filename, create_directory_if_not_exists, is_video_format_supported
+from app.utils import human_readable_size, format_timestamp
+from app.thumbnails import ThumbnailCache
 
 # Configuração da aplicação Flask
 app = Flask(__name__, 
@@ -29,6 +38,25 @@ app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.dirname(os.pa
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024 * 1024  # 1000 MB max upload size
 app.config['ALLOWED_EXTENSIONS'] = {'mp4', 'mkv', 'avi', 'mov', 'webm'}
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
+app.config['TRACK_ANALYSIS_WORKERS'] = max(1, (os.cpu_count() or 2) - 1)
+app.config['TRACKS_FOLDER'] = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'tracks')
+app.config['TRACK_CACHE_MAX_BYTES'] = 512 * 1024 * 1024
+app.config['TRACK_FILL_ON_MISS'] = True  # Gera em segundo plano a trilha que faltou no cache
+app.config['TRACK_HTTP_MAX_AGE'] = 60  # Segundos de cache das trilhas servidas por HTTP
+app.config['THUMBNAILS_FOLDER'] = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'thumbnails')
+app.config['THUMBNAIL_MAX_AGE'] = 31536000  # Endereços das miniaturas mudam com o vídeo
+app.config['METADATA_RECHECK_INTERVAL'] = 60.0  # Segundos entre verificações de vídeos sobrescritos na listagem
+app.config['PROCESSING_WORKERS'] = max(3, os.cpu_count() or 2)  # Threads decodificando ao mesmo tempo; as que sobram de BACKGROUND_WORKERS limitam as reproduções que decodificam
+app.config['BACKGROUND_WORKERS'] = max(1, app.config['PROCESSING_WORKERS'] // 4)  # Threads usadas ao mesmo tempo por preparação e análise de trilhas
+app.config['MAX_PLAYBACK_SESSIONS'] = 64  # Reproduções ao mesmo tempo, contando as pausadas e as servidas de trilhas
+app.config['MAX_PENDING_TASKS'] = 64  # Tarefas aguardando na fila antes de recusar novas
+
+app.config['LIVE_OUTPUT_FPS'] = 30.0  # Cores enviadas por segundo de vídeo no processamento ao vivo
+
+# Sincronização com a reprodução no cliente (segundos)
+PLAYBACK_SYNC_TOLERANCE = 1.0  # Distância máxima antes de reposicionar a decodificação
+PLAYBACK_MAX_WAIT = 0.1  # Espera máxima entre frames durante a reprodução
+PLAYBACK_IDLE_WAIT = 0.5  # Espera entre verificações com o vídeo pausado
 
 
 def cleanup_temp_files():
@@ -66,13 +94,36 @@ db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__)
 db_manager = DatabaseManager(db_path)
 settings_model = Settings(db_manager)
 history_model = History(db_manager)
+video_metadata = VideoMetadata(db_manager, recheck_interval=app.config['METADATA_RECHECK_INTERVAL'])
+
+# Processadores Ambilight por sessão de cliente
+processor_pool = ProcessorPool()
+
+# Agendador das tarefas de processamento: reprodução à frente das de segundo plano
+task_scheduler = TaskScheduler(
+    max_workers=app.config['PROCESSING_WORKERS'],
+    max_background=app.config['BACKGROUND_WORKERS'],
+    max_pending=app.config['MAX_PENDING_TASKS'],
+    max_sessions=app.config['MAX_PLAYBACK_SESSIONS']
+)
+
+# Tarefas de processamento de vídeo e relógios de reprodução, por sessão
+video_tasks = {}
+playback_clocks = {}
 
-# Instância global do processador Ambilight
-ambilight_processor = AmbilightProcessor()
+# Cache de trilhas de cores e análises offline em andamento, por chave do cache
+track_cache = ColorTrackCache(app.config['TRACKS_FOLDER'], app.config['TRACK_CACHE_MAX_BYTES'])
+track_jobs = {}
+track_job_tasks = {}
+track_jobs_lock = threading.Lock()
 
-# Threads de processamento de vídeo
-video_threads = {}
-video_stop_events = {}
+# Miniaturas e folhas de sprites, e as gerações pedidas por requisições sem cache
+thumbnail_cache = ThumbnailCache(app.config['THUMBNAILS_FOLDER'])
+thumbnail_jobs = set()
+thumbnail_jobs_lock = threading.Lock()
+
+# Preparação dos vídeos após o upload: probe antes, os demais estágios em paralelo
+ingest_pipeline = IngestPipeline(task_scheduler)
 
 # Funções utilitárias
 def allowed_file(filename):
@@ -95,12 +146,248 @@ def get_history(limit=10):
     """Recupera o histórico de vídeos."""
     return history_model.get_all(limit)
 
-def process_video(video_path, client_sid):
+def emit_colors(client_sid, color_frame, encoder=None, media_time=0.0):
+    """Envia as cores de um frame ao cliente, completas, como delta ou binárias."""
+    if encoder is None:
+        socketio.emit('colors', color_frame.to_dict(), room=client_sid)
+    else:
+        if isinstance(encoder, ColorBinaryEncoder):
+            message = encoder.encode(color_frame.zones, media_time)
+        else:
+            message = encoder.encode(color_frame.zones)
+        if message is not None:
+            socketio.emit(message[0], message[1], room=client_sid)
+
+def serve_color_track(video_path, client_sid, processor, encoder, stop_event, clock):
+    """
+    Envia as cores da trilha pré-calculada do vídeo, sem decodificá-lo.
+    Segue o relógio de reprodução do cliente e fica ocioso enquanto o vídeo está pausado.
+    
+    A trilha corresponde às configurações atuais da sessão: se as zonas ou o
+    modo de cor mudarem, a trilha é procurada novamente no cache.
+    
+    Returns:
+        True se a sessão foi parada; False se não há trilha para as configurações
+        atuais e o processamento deve seguir decodificando o vídeo
+    """
+    track_settings = session_track_settings(processor)
+    track = track_cache.get(video_path, track_settings)
+    if track is None:
+        return False
+    
+    duration = max(track.duration, 0.001)
+    last_sent = None
+    while not stop_event.is_set():
+        # Mudança de zonas ou modo de cor durante a reprodução
+        if session_track_settings(processor) != track_settings:
+            track_settings = session_track_settings(processor)
+            track = track_cache.get(video_path, track_settings)
+            if track is None:
+                return False
+            duration = max(track.duration, 0.001)
+            last_sent = None
+        
+        _, playing, media_time, rate = clock.snapshot()
+        
+        # Sem eventos do cliente, o vídeo é reiniciado ao final como antes
+        if media_time > duration and not clock.synced:
+            clock.seek(0.0)
+            continue
+        
+        # Reenvia apenas quando o frame da trilha ou a intensidade mudam
+        index = track.index_at(media_time)
+        if (index, processor.intensity) != last_sent:
+            color_frame = ColorFrame(track.colors_at(media_time)).scaled(processor.intensity)
+            emit_colors(client_sid, color_frame, encoder, float(track.timestamps[index]))
+            last_sent = (index, processor.intensity)
+        
+        if playing and index + 1 < len(track):
+            # Dorme até o próximo frame da trilha ou até uma mudança no relógio
+            clock.wait(min((track.timestamps[index + 1] - media_time) / rate, PLAYBACK_MAX_WAIT))
+        else:
+            clock.wait(PLAYBACK_IDLE_WAIT)
+    return True
+
+def session_track_settings(processor):
+    """Configurações de uma sessão que identificam a sua trilha de cores."""
+    return {'zones_per_side': processor.zones_per_side, 'color_mode': processor.color_mode}
+
+def run_track_analysis(job_key, video_path, settings, stop_event=None):
+    """Gera a trilha de cores de um vídeo e a guarda no cache."""
+    try:
+        track = analyze_video(video_path, settings, workers=app.config['TRACK_ANALYSIS_WORKERS'],
+                              stop_event=stop_event)
+        if stop_event is not None and stop_event.is_set():
+            # Cancelada: a situação fica a cargo de quem cancelou
+            return
+        if track is None:
+            raise ValueError('Não foi possível ler o vídeo')
+        track_cache.put(video_path, settings, track)
+        status = {'status': 'done', 'frames': len(track), 'duration': track.duration}
+    except Exception as e:
+        print(f"Erro ao analisar vídeo {video_path}: {e}")
+        status = {'status': 'error', 'error': str(e)}
+    
+    with track_jobs_lock:
+        track_jobs[job_key] = status
+        track_job_tasks.pop(job_key, None)
+
+def request_track_analysis(video_path, settings, background=True):
+    """
+    Inicia a análise da trilha de um vídeo, se ela não estiver em cache nem em andamento.
+    Com background=False, a análise é feita na thread atual.
+    
+    Returns:
+        Situação da trilha: 'done', 'running', 'started' ou 'error' se o agendador recusar a análise
+    """
+    job_key = track_cache.key(video_path, settings)
+    if track_cache.contains(video_path, settings):
+        return 'done'
+    
+    with track_jobs_lock:
+        if track_jobs.get(job_key, {}).get('status') == 'running':
+            return 'running'
+        track_jobs[job_key] = {'status': 'running'}
+    
+    if not background:
+        run_track_analysis(job_key, video_path, settings)
+        return 'started'
+    
+    stop_event = threading.Event()
+    try:
+        task = task_scheduler.submit(run_track_analysis, job_key, video_path, settings, stop_event,
+                                     priority=PRIORITY_BACKGROUND, name=f'track:{os.path.basename(video_path)}',
+                                     stop_event=stop_event)
+    except SchedulerFull as e:
+        with track_jobs_lock:
+            track_jobs[job_key] = {'status': 'error', 'error': str(e)}
+        return 'error'
+    
+    with track_jobs_lock:
+        track_job_tasks[job_key] = task
+    return 'started'
+
+def ingest_probe(video_path):
+    """Estágio de preparação: confirma que o vídeo decodifica e detecta as tarjas pretas."""
+    area = get_active_area(video_path)
+    if area is None:
+        raise ValueError('Não foi possível ler o vídeo')
+    return {'active_area': list(area)}
+
+def ingest_metadata(video_path):
+    """Estágio de preparação: lê os metadados do vídeo e os registra no banco."""
+    return video_metadata.refresh(video_path)
+
+def ingest_thumbnail(video_path):
+    """Estágio de preparação: gera a miniatura e a folha de sprites do vídeo."""
+    return thumbnail_cache.generate(video_path)
+
+def run_thumbnail_generation(video_path):
+    """Gera a miniatura de um vídeo pedida por uma requisição."""
+    try:
+        thumbnail_cache.generate(video_path)
+    finally:
+        with thumbnail_jobs_lock:
+            thumbnail_jobs.discard(video_path)
+
+def request_thumbnails(video_path):
+    """Agenda em segundo plano a geração da miniatura de um vídeo, se ainda não estiver agendada."""
+    with thumbnail_jobs_lock:
+        if video_path in thumbnail_jobs:
+            return
+        thumbnail_jobs.add(video_path)
+    
+    try:
+        task_scheduler.submit(run_thumbnail_generation, video_path, priority=PRIORITY_BACKGROUND,
+                              name=f'thumbnail:{os.path.basename(video_path)}')
+    except SchedulerFull:
+        with thumbnail_jobs_lock:
+            thumbnail_jobs.discard(video_path)
+
+def ingest_color_track(video_path):
+    """Estágio de preparação: gera a trilha de cores com as configurações salvas."""
+    settings = get_settings()
+    job_key = track_cache.key(video_path, settings)
+    
+    # Uma análise iniciada pela reprodução é aguardada em vez de repetida; se ainda
+    # estiver na fila, é feita aqui, para não ocupar duas threads de segundo plano
+    while request_track_analysis(video_path, settings, background=False) == 'running':
+        with track_jobs_lock:
+            task = track_job_tasks.get(job_key)
+            if task is not None and task.state == 'queued':
+                task.cancel()
+                track_jobs.pop(job_key, None)
+                track_job_tasks.pop(job_key, None)
+                continue
+        if task is not None:
+            task.wait(1.0)
+        else:
+            time.sleep(1.0)
+    
+    with track_jobs_lock:
+        status = track_jobs.get(job_key, {'status': 'done'})
+    if status.get('status') == 'error':
+        raise ValueError(status.get('error'))
+    return status
+
+def create_video_producer(video_path, clock):
+    """Cria um produtor compartilhado de um vídeo, que envia para as salas 'video:<arquivo>:<n>'."""
+    return VideoProducer(
+        video_path, f'video:{os.path.basename(video_path)}:{next(producer_sequence)}',
+        emit=lambda event, data, room: socketio.emit(event, data, room=room),
+        enter_room=lambda sid, room: socketio.server.enter_room(sid, room, namespace='/'),
+        leave_room=lambda sid, room: socketio.server.leave_room(sid, room, namespace='/'),
+        clock=clock,
+        output_fps=app.config['LIVE_OUTPUT_FPS'],
+        idle=task_scheduler.idle
+    )
+
+def start_video_producer(producer):
+    """Agenda o produtor compartilhado como uma única tarefa de reprodução."""
+    stop_event = threading.Event()
+    task = task_scheduler.submit(producer.run, stop_event, priority=PRIORITY_INTERACTIVE,
+                                 name=f'shared:{os.path.basename(producer.video_path)}', stop_event=stop_event)
+    task.on_cancel = producer.clock.wake
+    return task
+
+# Sessões no mesmo ponto do mesmo vídeo, em modo compartilhado, usam uma única decodificação
+producer_sequence = itertools.count(1)
+fanout_registry = FanoutRegistry(start_video_producer, create_video_producer, tolerance=PLAYBACK_SYNC_TOLERANCE)
+
+ingest_pipeline.add_stage('probe', ingest_probe)
+ingest_pipeline.add_stage('metadata', ingest_metadata, after=['probe'])
+ingest_pipeline.add_stage('thumbnail', ingest_thumbnail, after=['probe'])
+ingest_pipeline.add_stage('color_track', ingest_color_track, after=['probe'])
+
+def process_video(video_path, client_sid, processor, clock, encoder=None, stop_event=None, output_fps=None):
     """
-    Processa um vídeo frame por frame e envia dados de cores para o cliente.
-    Executado em uma thread separada.
+    Processa um vídeo e envia dados de cores para o cliente.
+    Executado pelo agendador de tarefas, com o processador exclusivo da sessão.
+    
+    Segue o relógio de reprodução do cliente: decodifica os frames no instante
+    em que o cliente os exibe, na taxa output_fps (LIVE_OUTPUT_FPS por padrão),
+    reposiciona o vídeo em saltos, fica ocioso (sem ocupar uma vaga do
+    agendador) enquanto ele está pausado e
+    avisa o cliente ('processing_lag') quando não acompanha a reprodução.
+    
+    Se um ColorDeltaEncoder for fornecido, envia keyframes periódicos e apenas
+    as zonas alteradas entre eles, em vez do dicionário completo a cada frame;
+    com um ColorBinaryEncoder, envia cada frame como mensagem binária.
     """
-    stop_event = video_stop_events.get(client_sid, threading.Event())
+    stop_event = stop_event or threading.Event()
+    
+    # Com uma trilha em cache, as cores são servidas sem decodificar o vídeo e sem
+    # ocupar uma vaga de processamento
+    if os.path.isfile(video_path):
+        with task_scheduler.idle():
+            served = serve_color_track(video_path, client_sid, processor, encoder, stop_event, clock)
+        if served:
+            return
+        if app.config['TRACK_FILL_ON_MISS']:
+            request_track_analysis(video_path, session_track_settings(processor))
+    
+    # Sessões iniciadas ociosas esperam aqui uma vaga para decodificar
+    task_scheduler.resume()
     
     try:
         cap = cv2.VideoCapture(video_path)
@@ -108,29 +395,32 @@ def process_video(video_path, client_sid):
             socketio.emit('error', {'message': 'Não foi possível abrir o vídeo'}, room=client_sid)
             return
         
-        settings = get_settings()
-        ambilight_processor.set_zones_per_side(settings['zones_per_side'])
-        ambilight_processor.set_intensity(settings['intensity'])
-        ambilight_processor.set_blur_amount(settings['blur_amount'])
-        
-        frame_count = 0
-        while not stop_event.is_set():
-            ret, frame = cap.read()
-            if not ret:
-                # Reinicia o vídeo ao final
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                continue
-            
-            # Processa apenas 1 a cada 3 frames para melhor desempenho
-            if frame_count % 3 == 0:
-                try:
-                    colors = ambilight_processor.extract_border_colors(frame)
-                    socketio.emit('colors', colors, room=client_sid)
-                except Exception as e:
-                    print(f"Erro ao processar frame: {e}")
-            
-            frame_count += 1
-            time.sleep(0.03)  # Limita para cerca de 30fps
+        # Ignora tarjas pretas (detectadas uma vez por arquivo)
+        processor.set_active_area(get_active_area(video_path))
+        
+        def report_lag(lag, dropped):
+            print(f"Processamento de {client_sid} atrasado {lag:.2f}s ({dropped} frames perdidos)")
+            socketio.emit('processing_lag', {'lag': round(lag, 3), 'dropped': dropped}, room=client_sid)
+        
+        # Entrega os frames no ritmo do relógio de mídia, na taxa de saída da sessão
+        capture = PacedCapture(
+            cap, clock,
+            output_fps=output_fps or app.config['LIVE_OUTPUT_FPS'],
+            sync_tolerance=PLAYBACK_SYNC_TOLERANCE,
+            max_wait=PLAYBACK_MAX_WAIT,
+            idle_wait=PLAYBACK_IDLE_WAIT,
+            idle=task_scheduler.idle
+        )
+        
+        # Analisa com mais frequência perto de cortes de cena e menos em planos estáticos
+        sampler = AdaptiveSampler()
+        for frame, pts in capture.frames(stop_event, sampler, on_lag=report_lag):
+            try:
+                color_frame = processor.extract_color_frame(frame)
+                sampler.update(color_frame.zones)
+                emit_colors(client_sid, color_frame, encoder, pts)
+            except Exception as e:
+                print(f"Erro ao processar frame: {e}")
     
     except Exception as e:
         socketio.emit('error', {'message': f'Erro ao processar vídeo: {str(e)}'}, room=client_sid)
@@ -138,12 +428,6 @@ def process_video(video_path, client_sid):
         if 'cap' in locals():
             cap.release()
 
-# Atualiza as configurações do processador Ambilight com base nas configurações salvas
-settings = get_settings()
-ambilight_processor.set_zones_per_side(settings['zones_per_side'])
-ambilight_processor.set_intensity(settings['intensity'])
-ambilight_processor.set_blur_amount(settings['blur_amount'])
-
 # Rotas Flask
 @app.route('/')
 def index():
@@ -179,18 +463,62 @@ def update_settings_api():
             'autoplay': bool(data.get('autoplay', False))
         }
         
-        # Atualiza o processador Ambilight
-        ambilight_processor.set_zones_per_side(settings['zones_per_side'])
-        ambilight_processor.set_intensity(settings['intensity'])
-        ambilight_processor.set_blur_amount(settings['blur_amount'])
-        
-        # Salva as configurações
+        # Salva as configurações (aplicadas às próximas sessões)
         save_settings(settings)
         
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/tracks/<path:filename>', methods=['POST'])
+def start_track_analysis_api(filename):
+    """API para iniciar a análise offline da trilha de cores de um vídeo."""
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(video_path):
+        return jsonify({'success': False, 'error': 'Arquivo de vídeo não encontrado'}), 404
+    
+    status = request_track_analysis(video_path, get_settings())
+    if status == 'error':
+        return jsonify({'success': False, 'error': 'Fila de processamento cheia'}), 503
+    return jsonify({'success': True, 'status': 'done' if status == 'done' else 'running'})
+
+@app.route('/api/tracks/<path:filename>', methods=['GET'])
+def get_track_status_api(filename):
+    """API para consultar a análise da trilha de cores de um vídeo."""
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(video_path):
+        return jsonify({'success': False, 'error': 'Arquivo de vídeo não encontrado'}), 404
+    
+    settings = get_settings()
+    with track_jobs_lock:
+        status = track_jobs.get(track_cache.key(video_path, settings))
+    
+    if status is None:
+        status = {'status': 'done' if track_cache.contains(video_path, settings) else 'missing'}
+    
+    return jsonify({'success': True, **status})
+
+@app.route('/api/ingest/<path:filename>', methods=['GET'])
+def get_ingest_status_api(filename):
+    """API para consultar a preparação de um vídeo enviado, estágio por estágio."""
+    status = ingest_pipeline.status(filename)
+    if status is None:
+        return jsonify({'success': False, 'error': 'Nenhuma preparação registrada para o vídeo'}), 404
+    
+    return jsonify({'success': True, **status})
+
+@app.route('/api/track-cache', methods=['GET'])
+def get_track_cache_api():
+    """API para obter os contadores e a ocupação do cache de trilhas."""
+    return jsonify(track_cache.stats())
+
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler_api():
+    """API para obter as tarefas em execução e na fila do agendador."""
+    stats = task_scheduler.stats()
+    stats['shared'] = fanout_registry.stats()
+    return jsonify(stats)
+
 @app.route('/api/history', methods=['GET'])
 def get_history_api():
     """API para obter histórico de vídeos."""
@@ -224,7 +552,16 @@ def get_videos_api():
     allowed_extensions = app.config['ALLOWED_EXTENSIONS']
     
     try:
-        videos = list_supported_videos(uploads_dir, allowed_extensions)
+        # Na maior parte das requisições, apenas um os.stat do diretório antes da consulta
+        video_metadata.sync(uploads_dir, allowed_extensions)
+        
+        videos = video_metadata.list_all()
+        for video in videos:
+            video['size_human'] = human_readable_size(video['size'])
+            video['modified'] = video['mtime']
+            video['modified_human'] = format_timestamp(video['mtime'])
+            # A versão no endereço permite cache longo: muda quando o arquivo muda
+            video['thumbnail'] = f"/thumbnails/{video['filename']}?v={int(video['mtime'])}"
         return jsonify(videos)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -248,10 +585,14 @@ def upload_file():
         # Adiciona ao histórico
         add_to_history(filename, file_path)
         
+        # Prepara o vídeo em segundo plano antes da primeira reprodução
+        ingest_pipeline.submit(file_path)
+        
         return jsonify({
             'success': True, 
             'filename': filename, 
-            'path': f'/uploads/{filename}'
+            'path': f'/uploads/{filename}',
+            'ingest': f'/api/ingest/{filename}'
         })
     
     return jsonify({'success': False, 'error': 'Tipo de arquivo não permitido'})
@@ -323,6 +664,98 @@ def stream_video(filename):
     mime_type = mimetypes.guess_type(filename)[0] or 'video/mp4'
     return Response(generate(), mimetype=mime_type)
 
+@app.route('/tracks/<filename>')
+def stream_color_track(filename):
+    """
+    Serve a trilha de cores de um vídeo em um intervalo de tempo (?from=&to=, em segundos),
+    no formato binário compacto, para que o cliente busque as cores adiantado.
+    Suporta requisições condicionais por ETag.
+    """
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
+    if not os.path.exists(video_path):
+        return "File not found", 404
+    
+    settings = get_settings()
+    track = track_cache.get(video_path, settings)
+    if track is None:
+        # Sem trilha ainda: o cliente pode tentar novamente ou usar o websocket
+        status = request_track_analysis(video_path, settings) if app.config['TRACK_FILL_ON_MISS'] else 'missing'
+        response = jsonify({'success': False, 'status': 'running' if status != 'missing' else status})
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 404
+    
+    try:
+        start_time = max(0.0, float(request.args.get('from', 0.0)))
+        end_time = float(request.args.get('to', track.duration))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Intervalo de tempo inválido'}), 400
+    if end_time < start_time:
+        return jsonify({'success': False, 'error': 'Intervalo de tempo inválido'}), 400
+    
+    # A trilha de uma chave nunca muda: o ETag depende só dela e dos frames do intervalo
+    start_index = track.index_at(start_time)
+    end_index = max(start_index, int(np.searchsorted(track.timestamps, end_time, side='right')))
+    etag = f"{track_cache.key(video_path, settings)}-{start_index}-{end_index}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(track.window(start_time, end_time).to_bytes(), mimetype='application/octet-stream')
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={app.config['TRACK_HTTP_MAX_AGE']}"
+    return response
+
+def send_thumbnail_file(filename, kind):
+    """Serve um arquivo do cache de miniaturas, ou agenda a sua geração se ainda não existir."""
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(video_path):
+        return "File not found", 404
+    
+    # Nunca decodifica durante a requisição: uma entrada ausente ou desatualizada é gerada em segundo plano
+    if thumbnail_cache.get(video_path) is None:
+        request_thumbnails(video_path)
+        return "Thumbnail not ready", 404
+    
+    poster_path, sprite_path, _ = thumbnail_cache.paths(filename)
+    path = poster_path if kind == 'poster' else sprite_path
+    
+    response = send_from_directory(app.config['THUMBNAILS_FOLDER'], os.path.basename(path),
+                                   max_age=app.config['THUMBNAIL_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/thumbnails/<filename>')
+def video_thumbnail(filename):
+    """Serve a miniatura de um vídeo."""
+    return send_thumbnail_file(filename, 'poster')
+
+@app.route('/thumbnails/<filename>/sprite')
+def video_sprite(filename):
+    """Serve a folha de sprites de um vídeo, usada nas prévias da barra de progresso."""
+    return send_thumbnail_file(filename, 'sprite')
+
+@app.route('/api/thumbnails/<filename>')
+def get_thumbnails_api(filename):
+    """API para obter a disposição da folha de sprites de um vídeo."""
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(video_path):
+        return jsonify({'success': False, 'error': 'Arquivo de vídeo não encontrado'}), 404
+    
+    info = thumbnail_cache.get(video_path)
+    if info is None:
+        request_thumbnails(video_path)
+        return jsonify({'success': False, 'status': 'running'}), 404
+    
+    version = int(info['mtime'])
+    return jsonify({
+        'success': True,
+        **info,
+        'poster': f'/thumbnails/{filename}?v={version}',
+        'sprite': f'/thumbnails/{filename}/sprite?v={version}'
+    })
+
 @app.route('/api/upload-chunk', methods=['POST'])
 def upload_chunk():
     """API para fazer upload de um chunk do arquivo."""
@@ -388,10 +821,14 @@ def finalize_upload():
         # Adicionar ao histórico
         add_to_history(file_name, final_path)
         
+        # Preparar o vídeo em segundo plano antes da primeira reprodução
+        ingest_pipeline.submit(final_path)
+        
         return jsonify({
             'success': True,
             'filename': file_name,
-            'path': f'/uploads/{file_name}'
+            'path': f'/uploads/{file_name}',
+            'ingest': f'/api/ingest/{file_name}'
         })
         
     except Exception as e:
@@ -400,6 +837,25 @@ def finalize_upload():
     
 
 # Eventos Socket.IO
+def stop_video_task(client_sid, timeout=None):
+    """
+    Cancela o processamento de vídeo de uma sessão.
+    
+    Args:
+        client_sid: ID da sessão
+        timeout: Tempo máximo para esperar a tarefa terminar; None para não esperar
+        
+    Returns:
+        True se não há tarefa ou ela terminou dentro do tempo
+    """
+    fanout_registry.unsubscribe(client_sid)
+    
+    task = video_tasks.pop(client_sid, None)
+    if task is None:
+        return True
+    task.cancel()
+    return task.wait(timeout) if timeout is not None else True
+
 @socketio.on('connect')
 def handle_connect():
     """Manipula nova conexão websocket."""
@@ -411,15 +867,11 @@ def handle_disconnect():
     print(f"Cliente desconectado: {request.sid}")
     
     # Para qualquer processamento de vídeo em execução para este cliente
-    if request.sid in video_threads:
-        if request.sid in video_stop_events:
-            video_stop_events[request.sid].set()
-        
-        thread = video_threads.pop(request.sid, None)
-        if thread and thread.is_alive():
-            thread.join(timeout=1.0)
-        
-        video_stop_events.pop(request.sid, None)
+    finished = stop_video_task(request.sid, timeout=1.0)
+    
+    playback_clocks.pop(request.sid, None)
+    # Um processador ainda em uso pela tarefa não pode ser reaproveitado por outra sessão
+    processor_pool.release(request.sid, reuse=finished)
 
 @socketio.on('start_video_processing')
 def handle_start_processing(data):
@@ -434,42 +886,113 @@ def handle_start_processing(data):
     if video_path.startswith('/uploads/'):
         video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_path.replace('/uploads/', ''))
     
-    # Para qualquer processamento anterior
-    if request.sid in video_stop_events:
-        video_stop_events[request.sid].set()
+    # Para qualquer processamento anterior, que usa o mesmo processador da sessão
+    if not stop_video_task(request.sid, timeout=1.0):
+        # A tarefa anterior ainda não terminou e pode estar usando o processador: a sessão
+        # passa a usar outro, com as mesmas configurações
+        processor_pool.replace(request.sid)
     
-    if request.sid in video_threads:
-        old_thread = video_threads.pop(request.sid)
-        if old_thread and old_thread.is_alive():
-            old_thread.join(timeout=1.0)
+    # Processador da sessão, com as configurações salvas se for novo
+    processor = processor_pool.acquire(request.sid, get_settings())
+    processor.reset()
     
-    # Cria novo evento de parada
-    video_stop_events[request.sid] = threading.Event()
+    # Modo de envio: 'full' (padrão, dicionário completo), 'delta' ou 'binary';
+    # clientes antigos não informam 'binary' e continuam recebendo JSON
+    emission = data.get('emission', 'full')
+    encoder = None
+    if emission == 'binary':
+        encoder = ColorBinaryEncoder()
+    elif emission == 'delta':
+        try:
+            encoder = ColorDeltaEncoder(
+                threshold=int(data.get('delta_threshold', 8)),
+                keyframe_interval=int(data.get('keyframe_interval', 30))
+            )
+        except (TypeError, ValueError):
+            emit('error', {'message': 'Parâmetros de envio delta inválidos'})
+            return
     
-    # Inicia nova thread de processamento
-    thread = threading.Thread(
-        target=process_video,
-        args=(video_path, request.sid)
-    )
-    thread.daemon = True
-    thread.start()
+    # Relógio de reprodução, a partir do estado do player informado pelo cliente
+    try:
+        clock = PlaybackClock(
+            media_time=float(data.get('media_time', 0.0)),
+            playing=not data.get('paused', False),
+            rate=float(data.get('rate', 1.0))
+        )
+        output_fps = min(float(data.get('output_fps', app.config['LIVE_OUTPUT_FPS'])), 120.0)
+    except (TypeError, ValueError):
+        emit('error', {'message': 'Estado de reprodução inválido'})
+        return
     
-    video_threads[request.sid] = thread
+    # Modo compartilhado: sem trilha em cache, a sessão se inscreve na decodificação de
+    # outras sessões que estejam no mesmo ponto do vídeo
+    if data.get('shared') and not track_cache.contains(video_path, session_track_settings(processor)):
+        try:
+            producer = fanout_registry.subscribe(video_path, request.sid, processor, clock,
+                                                 binary=emission == 'binary')
+        except SchedulerFull as e:
+            emit('error', {'message': f'Servidor ocupado: {str(e)}'})
+            return
+        
+        # A sessão mantém o seu relógio; os seus eventos não movem as outras sessões
+        playback_clocks[request.sid] = clock
+        add_to_history(os.path.basename(video_path), video_path)
+        emit('processing_started', {'success': True, 'emission': 'binary' if emission == 'binary' else 'full',
+                                    'shared': True, 'viewers': len(producer)})
+        return
+    
+    # Agenda o processamento com prioridade de reprodução; com a trilha em cache, a sessão
+    # não decodifica e começa ociosa, fora do limite de reproduções que decodificam
+    stop_event = threading.Event()
+    try:
+        task = task_scheduler.submit(
+            process_video, video_path, request.sid, processor, clock, encoder, stop_event, output_fps,
+            priority=PRIORITY_INTERACTIVE, name=f'play:{request.sid}', stop_event=stop_event,
+            idle=track_cache.contains(video_path, session_track_settings(processor))
+        )
+    except SchedulerFull as e:
+        emit('error', {'message': f'Servidor ocupado: {str(e)}'})
+        return
+    task.on_cancel = clock.wake
+    
+    playback_clocks[request.sid] = clock
+    video_tasks[request.sid] = task
     
     # Adiciona ao histórico
     filename = os.path.basename(video_path)
     add_to_history(filename, video_path)
     
-    emit('processing_started', {'success': True})
+    emit('processing_started', {'success': True, 'emission': emission if encoder is not None else 'full'})
 
 @socketio.on('stop_video_processing')
 def handle_stop_processing():
     """Para o processamento de um vídeo."""
-    if request.sid in video_stop_events:
-        video_stop_events[request.sid].set()
+    stop_video_task(request.sid)
     
     emit('processing_stopped', {'success': True})
 
+@socketio.on('playback_sync')
+def handle_playback_sync(data):
+    """
+    Recebe um evento do player do cliente: 'play', 'pause', 'seek' ou 'rate',
+    com o instante atual do vídeo (media_time) e a velocidade (rate).
+    """
+    clock = playback_clocks.get(request.sid)
+    if clock is None:
+        return
+    
+    try:
+        clock.report(data.get('event'), data.get('media_time'), data.get('rate'))
+    except (TypeError, ValueError) as e:
+        emit('error', {'message': f'Evento de reprodução inválido: {str(e)}'})
+        return
+    
+    # Em modo compartilhado, a sessão segue em um produtor no mesmo ponto do vídeo
+    try:
+        fanout_registry.report(request.sid, data.get('event'), data.get('media_time'), data.get('rate'))
+    except SchedulerFull as e:
+        emit('error', {'message': f'Servidor ocupado: {str(e)}'})
+
 @socketio.on('update_settings')
 def handle_update_settings(data):
     """Atualiza as configurações do Ambilight."""
@@ -478,9 +1001,25 @@ def handle_update_settings(data):
         intensity = float(data.get('intensity', 1.0))
         blur = int(data.get('blur_amount', 15))
         
-        ambilight_processor.set_zones_per_side(zones)
-        ambilight_processor.set_intensity(intensity)
-        ambilight_processor.set_blur_amount(blur)
+        # Altera apenas o processador desta sessão
+        processor = processor_pool.acquire(request.sid, get_settings())
+        processor.set_zones_per_side(zones)
+        processor.set_intensity(intensity)
+        processor.set_blur_amount(blur)
+        if 'color_mode' in data:
+            processor.set_color_mode(data['color_mode'])
+        if 'sampling_error' in data:
+            processor.set_sampling_budget(data['sampling_error'])
+        
+        # Acorda a tarefa da sessão para que perceba a mudança mesmo com o vídeo pausado
+        clock = playback_clocks.get(request.sid)
+        if clock is not None:
+            clock.wake()
+        
+        # Aplica a mudança imediatamente a partir do último frame, sem nova decodificação
+        recomputed = processor.zones_from_profile()
+        if recomputed is not None:
+            emit('colors', zones_to_dict(recomputed))
         
         settings = {
             'zones_per_side': zones,
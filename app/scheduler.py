@@ -0,0 +1,340 @@
+"""
+Agendamento das tarefas de processamento de vídeo do Ambilight Player
+"""
+
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Prioridades: valores menores são executados primeiro
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class SchedulerFull(RuntimeError):
+    """Tarefa recusada porque o agendador atingiu o limite de admissão."""
+
+
+class TaskHandle:
+    """
+    Referência a uma tarefa agendada.
+
+    O cancelamento é cooperativo: uma tarefa ainda na fila é descartada; uma
+    tarefa em execução recebe o evento de parada e deve encerrar sozinha.
+    """
+
+    def __init__(self, scheduler: 'TaskScheduler', func: Callable, args: tuple, kwargs: Dict[str, Any],
+                 priority: int, name: str, stop_event: threading.Event):
+        self._scheduler = scheduler
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.name = name
+        self.stop_event = stop_event
+        self.state = 'queued'
+        self.error: Optional[BaseException] = None
+        self._finished = threading.Event()
+        # Chamado ao cancelar, por exemplo para acordar uma tarefa que está esperando
+        self.on_cancel: Optional[Callable[[], None]] = None
+
+    @property
+    def done(self) -> bool:
+        """Se a tarefa terminou, foi cancelada na fila ou falhou."""
+        return self._finished.is_set()
+
+    def cancel(self) -> None:
+        """Pede o cancelamento da tarefa."""
+        self.stop_event.set()
+        if self.on_cancel is not None:
+            self.on_cancel()
+        self._scheduler._discard(self)
+
+    @contextmanager
+    def idle(self) -> Iterator[None]:
+        """
+        Marca um trecho em que a tarefa em execução não processa, só espera.
+
+        Durante o trecho, a tarefa não conta no limite de reproduções nem ocupa
+        uma das max_workers threads. Ao sair, espera uma vaga para voltar a
+        processar, a menos que seja cancelada. Dentro de uma tarefa já ociosa,
+        não muda nada.
+        """
+        entered = self._scheduler._enter_idle(self)
+        try:
+            yield
+        finally:
+            if entered:
+                self._scheduler._leave_idle(self)
+
+    def resume(self) -> None:
+        """Faz uma tarefa ociosa voltar a processar, esperando uma vaga (ver TaskScheduler.submit)."""
+        self._scheduler._leave_idle(self)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a tarefa terminar.
+
+        Args:
+            timeout: Tempo máximo de espera em segundos
+
+        Returns:
+            True se a tarefa terminou dentro do tempo
+        """
+        return self._finished.wait(timeout)
+
+    def _finish(self, state: str) -> None:
+        self.state = state
+        self._finished.set()
+
+
+class TaskScheduler:
+    """
+    Executa tarefas em max_workers threads de processamento, por ordem de prioridade.
+
+    Tarefas interativas (reprodução) passam à frente das de segundo plano
+    (preparação de uploads, análise de trilhas), que nunca ocupam mais de
+    max_background threads ao mesmo tempo. As demais threads ficam reservadas
+    às tarefas interativas, que são recusadas quando não haveria thread
+    reservada para elas: uma reprodução aceita nunca espera por uma análise
+    longa. A fila tem tamanho limitado.
+
+    Só contam nesses limites as tarefas que estão processando. Uma tarefa
+    ociosa (ver TaskHandle.idle), como uma reprodução pausada ou servida de
+    uma trilha em cache, mantém a sua thread, e o agendador cria outra para
+    repor a de processamento; o total de reproduções, ociosas ou não, é
+    limitado por max_sessions.
+    """
+
+    def __init__(self, max_workers: int = 6, max_background: int = 2, max_pending: int = 64,
+                 max_sessions: int = 64):
+        """
+        Inicializa o agendador e suas threads.
+
+        Args:
+            max_workers: Número de threads de processamento (no mínimo 2)
+            max_background: Máximo de tarefas de segundo plano em execução ao mesmo tempo;
+                deixa ao menos uma thread para as tarefas interativas
+            max_pending: Máximo de tarefas aguardando na fila
+            max_sessions: Máximo de tarefas interativas, contando as ociosas
+        """
+        self.max_workers = max(2, int(max_workers))
+        self.max_background = max(1, min(int(max_background), self.max_workers - 1))
+        self.max_interactive = self.max_workers - self.max_background
+        self.max_pending = max(1, int(max_pending))
+        self.max_sessions = max(self.max_interactive, int(max_sessions))
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._running: List[TaskHandle] = []
+        self._idle: List[TaskHandle] = []
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._local = threading.local()
+
+        self._workers = []
+        self._worker_names = itertools.count()
+        for _ in range(self.max_workers):
+            self._add_worker()
+
+    def _add_worker(self, handle: Optional[TaskHandle] = None) -> None:
+        """Cria uma thread de execução, opcionalmente já com uma tarefa; exige o lock depois da inicialização."""
+        worker = threading.Thread(target=self._worker, args=(handle,), name=f'scheduler-{next(self._worker_names)}',
+                                  daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _count(self, interactive: bool, include_idle: bool = False) -> int:
+        """Tarefas em execução ou na fila de uma classe de prioridade; exige o lock."""
+        handles = self._running + [entry[2] for entry in self._queue]
+        return sum(1 for handle in handles
+                   if (handle.priority < PRIORITY_BACKGROUND) == interactive
+                   and (include_idle or handle not in self._idle))
+
+    def submit(self, func: Callable, *args, priority: int = PRIORITY_BACKGROUND, name: str = '',
+               stop_event: Optional[threading.Event] = None, idle: bool = False, **kwargs) -> TaskHandle:
+        """
+        Agenda uma tarefa.
+
+        Args:
+            func: Função a executar com os argumentos restantes
+            priority: PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND ou outro valor
+            name: Nome para diagnóstico
+            stop_event: Evento de parada observado pela tarefa; sinalizado no cancelamento
+            idle: Inicia a tarefa imediatamente, já ociosa, sem contar nos limites de
+                processamento; ela chama resume() antes de processar
+
+        Returns:
+            Referência à tarefa
+
+        Raises:
+            SchedulerFull: Se a fila estiver cheia, se não houver thread para uma tarefa
+                interativa ou se o limite de sessões for atingido
+        """
+        handle = TaskHandle(self, func, args, kwargs, priority, name or getattr(func, '__name__', 'task'),
+                            stop_event or threading.Event())
+        with self._condition:
+            if self._shutdown:
+                raise SchedulerFull('Agendador encerrado')
+            if len(self._queue) >= self.max_pending:
+                raise SchedulerFull('Fila de processamento cheia')
+            # Reproduções duram até serem paradas: sem thread reservada, esperar na fila não adianta
+            if priority < PRIORITY_BACKGROUND and (
+                    (not idle and self._count(interactive=True) >= self.max_interactive)
+                    or self._count(interactive=True, include_idle=True) >= self.max_sessions):
+                raise SchedulerFull('Limite de reproduções simultâneas atingido')
+
+            if idle:
+                # A tarefa ociosa ganha a sua própria thread, como as que entram em idle
+                self._running.append(handle)
+                self._idle.append(handle)
+                handle.state = 'running'
+                self._add_worker(handle)
+                return handle
+
+            heapq.heappush(self._queue, (priority, next(self._sequence), handle))
+            self._condition.notify_all()
+        return handle
+
+    def _next_task(self) -> Optional[TaskHandle]:
+        """Retira a tarefa de maior prioridade que pode começar agora; exige o lock."""
+        background_running = sum(1 for handle in self._running
+                                 if handle.priority >= PRIORITY_BACKGROUND and handle not in self._idle)
+        for entry in sorted(self._queue):
+            if entry[0] >= PRIORITY_BACKGROUND and background_running >= self.max_background:
+                continue
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            return entry[2]
+        return None
+
+    def _surplus(self) -> bool:
+        """Se há mais threads livres do que as de processamento; exige o lock."""
+        return len(self._workers) - len(self._idle) > self.max_workers
+
+    def _worker(self, handle: Optional[TaskHandle] = None) -> None:
+        """Laço de uma thread de execução, começando pela tarefa dada, se houver."""
+        while True:
+            if handle is None:
+                with self._condition:
+                    while True:
+                        # Threads criadas para repor as de tarefas ociosas encerram quando sobram
+                        if self._surplus():
+                            self._workers.remove(threading.current_thread())
+                            return
+                        handle = self._next_task()
+                        if handle is not None:
+                            break
+                        if self._shutdown:
+                            self._workers.remove(threading.current_thread())
+                            return
+                        self._condition.wait()
+                    self._running.append(handle)
+                    handle.state = 'running'
+
+            self._local.handle = handle
+            state = 'done'
+            try:
+                handle.func(*handle.args, **handle.kwargs)
+            except Exception as e:
+                print(f"Erro na tarefa {handle.name}: {e}")
+                handle.error = e
+                state = 'error'
+
+            self._local.handle = None
+            with self._condition:
+                self._running.remove(handle)
+                if handle in self._idle:
+                    self._idle.remove(handle)
+                self._condition.notify_all()
+            handle._finish('cancelled' if handle.stop_event.is_set() and state == 'done' else state)
+            handle = None
+
+    def _discard(self, handle: TaskHandle) -> None:
+        """Remove da fila uma tarefa cancelada que ainda não começou."""
+        with self._condition:
+            for entry in self._queue:
+                if entry[2] is handle:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    handle._finish('cancelled')
+                    break
+            # Acorda uma tarefa cancelada que espera vaga para sair de idle
+            self._condition.notify_all()
+
+    def _enter_idle(self, handle: TaskHandle) -> bool:
+        """Libera a vaga de uma tarefa em execução e repõe a sua thread; False se ela já estava ociosa."""
+        with self._condition:
+            if handle not in self._running or handle in self._idle:
+                return False
+            self._idle.append(handle)
+            if len(self._workers) - len(self._idle) < self.max_workers and not self._shutdown:
+                self._add_worker()
+            self._condition.notify_all()
+            return True
+
+    def _has_slot(self, handle: TaskHandle) -> bool:
+        """Se uma tarefa ociosa pode voltar a processar; exige o lock."""
+        if len(self._running) - len(self._idle) >= self.max_workers:
+            return False
+        if handle.priority < PRIORITY_BACKGROUND:
+            return self._count(interactive=True) < self.max_interactive
+        running_background = sum(1 for other in self._running
+                                 if other.priority >= PRIORITY_BACKGROUND and other not in self._idle)
+        return running_background < self.max_background
+
+    def _leave_idle(self, handle: TaskHandle) -> None:
+        """Espera uma vaga para a tarefa voltar a processar; cancelada, ela segue ociosa até terminar."""
+        with self._condition:
+            if handle not in self._idle:
+                return
+            while not self._has_slot(handle):
+                if handle.stop_event.is_set() or self._shutdown:
+                    return
+                self._condition.wait()
+            self._idle.remove(handle)
+            self._condition.notify_all()
+
+    @contextmanager
+    def idle(self) -> Iterator[None]:
+        """
+        TaskHandle.idle da tarefa executada pela thread atual.
+
+        Fora de uma tarefa do agendador, não faz nada.
+        """
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            yield
+            return
+        with handle.idle():
+            yield
+
+    def resume(self) -> None:
+        """TaskHandle.resume da tarefa executada pela thread atual, se houver."""
+        handle = getattr(self._local, 'handle', None)
+        if handle is not None:
+            handle.resume()
+
+    def stats(self) -> Dict[str, Any]:
+        """Ocupação atual do agendador."""
+        with self._condition:
+            return {
+                'workers': self.max_workers,
+                'max_interactive': self.max_interactive,
+                'max_background': self.max_background,
+                'max_sessions': self.max_sessions,
+                'threads': len(self._workers),
+                'running': [{'name': handle.name, 'priority': handle.priority, 'idle': handle in self._idle}
+                            for handle in self._running],
+                'pending': [{'name': handle.name, 'priority': priority} for priority, _, handle in sorted(self._queue)],
+            }
+
+    def shutdown(self) -> None:
+        """Cancela as tarefas e encerra as threads depois que as em execução terminarem."""
+        with self._condition:
+            self._shutdown = True
+            handles = self._running + [entry[2] for entry in self._queue]
+            self._condition.notify_all()
+        for handle in handles:
+            handle.cancel()
@@ -0,0 +1,113 @@
+"""
+Codificação das cores enviadas aos clientes do Ambilight Player
+"""
+
+import random
+import numpy as np
+from typing import Dict, Any, Optional, Tuple
+
+from app.ambilight import SIDES, ColorFrame, zones_to_dict
+
+
+class ColorDeltaEncoder:
+    """
+    Codifica as cores de um cliente como keyframes completos e deltas.
+
+    Guarda o último estado enviado ao cliente e, entre keyframes, envia apenas
+    as zonas cuja cor mudou mais do que o limiar em algum canal. Keyframes
+    periódicos permitem que o cliente se ressincronize.
+    """
+
+    def __init__(self, threshold: int = 8, keyframe_interval: int = 30):
+        """
+        Inicializa o codificador.
+
+        Args:
+            threshold: Variação mínima (0-255) em algum canal para reenviar uma zona
+            keyframe_interval: Número de frames entre keyframes completos
+        """
+        self.threshold = max(0, min(int(threshold), 255))
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.reset()
+
+    def reset(self) -> None:
+        """Esquece o estado enviado, forçando um keyframe no próximo frame."""
+        self.last_sent: Optional[np.ndarray] = None
+        self.frames_since_keyframe = 0
+        self.sequence = 0
+
+    def encode(self, zones: np.ndarray) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Codifica as cores de um frame.
+
+        Args:
+            zones: Array (4, zonas, 3) uint8 na ordem de SIDES
+
+        Returns:
+            Tupla (evento, dados) a emitir: ('colors', dicionário completo) para
+            keyframes ou ('colors_delta', zonas alteradas) para deltas; None se
+            nenhuma zona mudou além do limiar
+        """
+        self.frames_since_keyframe += 1
+
+        if (self.last_sent is None
+                or self.last_sent.shape != zones.shape
+                or self.frames_since_keyframe >= self.keyframe_interval):
+            self.last_sent = zones.copy()
+            self.frames_since_keyframe = 0
+            self.sequence += 1
+            return 'colors', zones_to_dict(zones)
+
+        diff = np.abs(zones.astype(np.int16) - self.last_sent).max(axis=-1)
+        changed = diff > self.threshold
+        if not changed.any():
+            return None
+
+        self.last_sent[changed] = zones[changed]
+        self.sequence += 1
+
+        # Dados no formato {'seq': n, 'top': [[zona, [R, G, B]], ...], ...}
+        delta = {'seq': self.sequence}
+        for side_index, zone_index in zip(*np.nonzero(changed)):
+            delta.setdefault(SIDES[side_index], []).append(
+                [int(zone_index), zones[side_index, zone_index].tolist()]
+            )
+        return 'colors_delta', delta
+
+
+class ColorBinaryEncoder:
+    """
+    Codifica as cores de um cliente como mensagens binárias ('colors_bin').
+
+    Cada mensagem é um ColorFrame serializado com marcação (versão 2 de
+    ColorFrame.to_bytes): as cores uint8 de cada zona, precedidas do fluxo,
+    do número de sequência e do instante do frame. Evita montar e serializar
+    o dicionário JSON no servidor e interpretá-lo no cliente.
+
+    Cada codificador tem um fluxo aleatório; quando as mensagens de um
+    cliente passam a vir de outro codificador, a mudança de fluxo indica que
+    a sequência recomeçou.
+    """
+
+    def __init__(self):
+        """Inicializa o codificador."""
+        self.stream = random.getrandbits(32)
+        self.reset()
+
+    def reset(self) -> None:
+        """Reinicia a numeração das mensagens."""
+        self.sequence = 0
+
+    def encode(self, zones: np.ndarray, media_time: float = 0.0) -> Tuple[str, bytes]:
+        """
+        Codifica as cores de um frame.
+
+        Args:
+            zones: Array (4, zonas, 3) uint8 na ordem de SIDES
+            media_time: Instante do frame no vídeo em segundos
+
+        Returns:
+            Tupla ('colors_bin', bytes da mensagem)
+        """
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        return 'colors_bin', ColorFrame(zones, (self.stream, self.sequence, float(media_time))).to_bytes()
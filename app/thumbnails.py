@@ -0,0 +1,97 @@
+"""
+Miniaturas e folhas de sprites dos vídeos do Ambilight Player
+"""
+
+import os
+import json
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from app.utils import generate_video_previews
+
+
+class ThumbnailCache:
+    """
+    Cache em disco da miniatura e da folha de sprites de cada vídeo.
+
+    Para cada vídeo são guardados três arquivos: a miniatura (.jpg), a folha
+    de sprites (.sprite.jpg) e a disposição da folha (.json), que também
+    registra o tamanho e a data de modificação do vídeo de origem para
+    invalidar a entrada quando o arquivo muda.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Inicializa o cache.
+
+        Args:
+            directory: Diretório das miniaturas
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self, filename: str) -> Tuple[str, str, str]:
+        """Caminhos da miniatura, da folha de sprites e da disposição de um vídeo."""
+        base = os.path.join(self.directory, filename)
+        return f"{base}.jpg", f"{base}.sprite.jpg", f"{base}.json"
+
+    def get(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtém a disposição da folha de sprites de um vídeo, se estiver atualizada.
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+
+        Returns:
+            Dicionário com a disposição, ou None se não houver entrada atualizada
+        """
+        _, _, info_path = self.paths(os.path.basename(video_path))
+        try:
+            stats = os.stat(video_path)
+            with open(info_path) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if info.get('size') != stats.st_size or info.get('mtime') != stats.st_mtime:
+            return None
+        return info
+
+    def generate(self, video_path: str) -> Dict[str, Any]:
+        """
+        Gera a miniatura e a folha de sprites de um vídeo, se não estiverem atualizadas.
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+
+        Returns:
+            Dicionário com a disposição da folha de sprites
+
+        Raises:
+            ValueError: Se o vídeo não puder ser lido
+        """
+        info = self.get(video_path)
+        if info is not None:
+            return info
+
+        stats = os.stat(video_path)
+        poster_path, sprite_path, info_path = self.paths(os.path.basename(video_path))
+
+        # Gera em arquivos temporários e renomeia, para nunca servir uma entrada parcial
+        suffix = f".{threading.get_ident()}.tmp"
+        temp_poster, temp_sprite = f"{poster_path}{suffix}.jpg", f"{sprite_path}{suffix}.jpg"
+        try:
+            info = generate_video_previews(video_path, temp_poster, temp_sprite)
+            info.update({'size': stats.st_size, 'mtime': stats.st_mtime})
+            with self._lock:
+                os.replace(temp_poster, poster_path)
+                os.replace(temp_sprite, sprite_path)
+                with open(f"{info_path}{suffix}", 'w') as f:
+                    json.dump(info, f)
+                os.replace(f"{info_path}{suffix}", info_path)
+        finally:
+            for temp_path in (temp_poster, temp_sprite):
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        return info
@@ -0,0 +1,570 @@
+"""
+Trilhas de cores pré-calculadas para o Ambilight Player
+
+Uma trilha guarda, para um vídeo, os instantes analisados e as cores das
+zonas em cada um deles. Ela é gerada uma única vez por uma análise offline
+e depois serve todas as reproduções do vídeo sem decodificá-lo novamente.
+"""
+
+import os
+import json
+import struct
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+import cv2
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.ambilight import AmbilightProcessor, BORDER_DEPTH, get_active_area
+
+# Extensão dos arquivos de trilha
+TRACK_EXTENSION = '.ambt'
+
+# Número de frames entre keyframes nos arquivos de trilha
+DEFAULT_KEYFRAME_INTERVAL = 30
+
+# Taxa de amostragem padrão da análise (amostras por segundo de vídeo)
+DEFAULT_SAMPLE_RATE = 30.0
+
+# Segmentos por processo na análise paralela, para equilibrar a carga entre eles
+SEGMENTS_PER_WORKER = 2
+
+# Tamanho mínimo de um segmento; vídeos menores são analisados em sequência
+MIN_SEGMENT_FRAMES = 300
+
+# Leitura antes do início de cada segmento, para compensar seeks que caem depois do frame pedido
+SEEK_PREROLL_SECONDS = 1.0
+
+
+class ColorTrack:
+    """
+    Cores das zonas de um vídeo ao longo do tempo.
+
+    Em disco, a trilha usa um formato binário próprio, lido por memória mapeada:
+
+    - cabeçalho de HEADER_SIZE bytes (ver HEADER);
+    - índice de instantes: float64[N], em segundos, em ordem crescente;
+    - registros de cores: uint8[N, 4, zonas, 3]. A cada keyframe_interval
+      frames o registro é a cor absoluta (keyframe); nos demais, é a diferença
+      módulo 256 para o frame anterior.
+
+    Ler um intervalo de tempo é uma busca binária no índice e uma soma
+    acumulada em uint8 a partir do keyframe anterior, sem interpretar o
+    arquivo inteiro nem carregá-lo na memória.
+    """
+
+    MAGIC = b'AMBT'
+    VERSION = 1
+    # magic, versão, bordas, zonas, intervalo de keyframes, frames
+    HEADER = struct.Struct('<4sHHHHI')
+    # Cabeçalho completado com zeros para manter o índice alinhado
+    HEADER_SIZE = 64
+
+    def __init__(self, timestamps: np.ndarray, colors: np.ndarray = None,
+                 records: np.ndarray = None, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        """
+        Inicializa a trilha a partir das cores absolutas ou dos registros codificados.
+
+        Args:
+            timestamps: Instantes analisados em segundos, em ordem crescente (N,)
+            colors: Cores das zonas em RGB, array uint8 (N, 4, zonas, 3)
+            records: Registros keyframe/delta, como gravados em disco
+            keyframe_interval: Número de frames entre keyframes
+        """
+        if (colors is None) == (records is None):
+            raise ValueError("Informe as cores absolutas ou os registros codificados")
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.records = records if records is not None else self._encode(np.asarray(colors, dtype=np.uint8))
+        if len(self.timestamps) != len(self.records):
+            raise ValueError("Número de instantes e de frames de cores diferentes")
+
+    def _encode(self, colors: np.ndarray) -> np.ndarray:
+        """Codifica cores absolutas como keyframes e deltas módulo 256."""
+        records = colors.copy()
+        np.subtract(colors[1:], colors[:-1], out=records[1:])
+        records[::self.keyframe_interval] = colors[::self.keyframe_interval]
+        return records
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def zones_per_side(self) -> int:
+        """Número de zonas por borda."""
+        return self.records.shape[2]
+
+    @property
+    def duration(self) -> float:
+        """Instante do último frame analisado, em segundos."""
+        return float(self.timestamps[-1]) if len(self.timestamps) else 0.0
+
+    def index_at(self, media_time: float) -> int:
+        """Índice do último frame analisado em ou antes do instante dado."""
+        index = int(np.searchsorted(self.timestamps, media_time, side='right')) - 1
+        return max(0, min(index, len(self.timestamps) - 1))
+
+    def decode(self, start: int, end: int) -> np.ndarray:
+        """
+        Decodifica as cores absolutas dos frames [start, end).
+
+        Args:
+            start: Índice do primeiro frame
+            end: Índice após o último frame
+
+        Returns:
+            Array uint8 (end - start, 4, zonas, 3) em RGB
+        """
+        keyframe = start - start % self.keyframe_interval
+        colors = np.empty((max(0, end - keyframe),) + self.records.shape[1:], dtype=np.uint8)
+        # Cada bloco começa em um keyframe absoluto; a soma acumulada em uint8 desfaz os deltas
+        for block in range(keyframe, end, self.keyframe_interval):
+            block_end = min(block + self.keyframe_interval, end)
+            np.add.accumulate(self.records[block:block_end], axis=0, dtype=np.uint8,
+                              out=colors[block - keyframe:block_end - keyframe])
+        return colors[start - keyframe:]
+
+    @property
+    def colors(self) -> np.ndarray:
+        """Cores absolutas de todos os frames, array uint8 (N, 4, zonas, 3)."""
+        return self.decode(0, len(self))
+
+    def colors_at(self, media_time: float) -> np.ndarray:
+        """
+        Cores das zonas em um instante do vídeo.
+
+        Args:
+            media_time: Instante em segundos
+
+        Returns:
+            Array uint8 (4, zonas, 3) em RGB
+        """
+        index = self.index_at(media_time)
+        return self.decode(index, index + 1)[0]
+
+    def colors_range(self, start_time: float, end_time: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Instantes e cores dos frames em um intervalo de tempo.
+
+        Inclui o frame em vigor no início do intervalo, para que o cliente
+        tenha cores desde start_time.
+
+        Args:
+            start_time: Início do intervalo em segundos
+            end_time: Fim do intervalo em segundos (inclusivo)
+
+        Returns:
+            Tupla (instantes (M,), cores uint8 (M, 4, zonas, 3))
+        """
+        start = self.index_at(start_time)
+        end = max(start, int(np.searchsorted(self.timestamps, end_time, side='right')))
+        return np.asarray(self.timestamps[start:end]), self.decode(start, end)
+
+    def window(self, start_time: float, end_time: float) -> 'ColorTrack':
+        """
+        Trilha independente com os frames de um intervalo de tempo.
+
+        Os instantes continuam absolutos e o primeiro frame vira keyframe.
+
+        Args:
+            start_time: Início do intervalo em segundos
+            end_time: Fim do intervalo em segundos (inclusivo)
+
+        Returns:
+            Trilha do intervalo, na memória
+        """
+        timestamps, colors = self.colors_range(start_time, end_time)
+        return ColorTrack(timestamps, colors, keyframe_interval=self.keyframe_interval)
+
+    def to_bytes(self) -> bytes:
+        """Serializa a trilha no formato binário usado em disco."""
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.records.shape[1],
+                                  self.zones_per_side, self.keyframe_interval, len(self))
+        return b''.join((
+            header.ljust(self.HEADER_SIZE, b'\0'),
+            self.timestamps.astype('<f8').tobytes(),
+            np.ascontiguousarray(self.records).tobytes(),
+        ))
+
+    def save(self, path: str) -> None:
+        """
+        Salva a trilha em disco no formato binário.
+
+        Args:
+            path: Caminho do arquivo de destino
+        """
+        # Escreve em um arquivo temporário e renomeia, para que leitores nunca vejam uma trilha parcial
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ColorTrack':
+        """
+        Abre uma trilha salva com save(), por memória mapeada.
+
+        Os dados não são lidos para a memória do processo: várias reproduções,
+        em vários processos, compartilham as mesmas páginas do arquivo.
+
+        Args:
+            path: Caminho do arquivo da trilha
+
+        Returns:
+            Trilha apoiada no arquivo
+        """
+        with open(path, 'rb') as f:
+            header = f.read(cls.HEADER_SIZE)
+        if len(header) < cls.HEADER_SIZE:
+            raise ValueError(f"Trilha truncada: {path}")
+
+        magic, version, sides, zones, keyframe_interval, frame_count = cls.HEADER.unpack_from(header)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"Formato de trilha não suportado: {path}")
+
+        timestamps = np.memmap(path, dtype='<f8', mode='r', offset=cls.HEADER_SIZE, shape=(frame_count,))
+        records = np.memmap(path, dtype=np.uint8, mode='r', offset=cls.HEADER_SIZE + 8 * frame_count,
+                            shape=(frame_count, sides, zones, 3))
+        return cls(timestamps, records=records, keyframe_interval=keyframe_interval)
+
+
+def track_settings(settings: Dict[str, Any], sample_rate: float = DEFAULT_SAMPLE_RATE) -> Dict[str, Any]:
+    """
+    Seleciona as configurações que alteram o conteúdo de uma trilha.
+
+    A intensidade não entra, pois é aplicada ao servir a trilha.
+
+    Args:
+        settings: Configurações do processador ou da sessão
+        sample_rate: Taxa de amostragem da análise
+
+    Returns:
+        Dicionário com zonas, profundidade da borda, modo de cor e taxa de amostragem
+    """
+    return {
+        'zones_per_side': int(settings.get('zones_per_side', 10)),
+        'depth': BORDER_DEPTH,
+        'color_mode': settings.get('color_mode', 'average'),
+        'sample_rate': float(sample_rate),
+    }
+
+
+class ColorTrackCache:
+    """
+    Cache em disco de trilhas de cores, com orçamento de tamanho e remoção LRU.
+
+    As entradas são identificadas pelo conteúdo do vídeo (não pelo nome) e
+    pelas configurações que alteram a trilha. O instante de último uso de cada
+    entrada é o mtime do seu arquivo, atualizado a cada acerto.
+    """
+
+    # Bytes lidos de cada amostra (início, meio e fim) na impressão digital do conteúdo
+    FINGERPRINT_CHUNK = 1024 * 1024
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Inicializa o cache.
+
+        Args:
+            directory: Diretório das trilhas
+            max_bytes: Tamanho máximo total das trilhas em disco
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints: Dict[Tuple[str, float, int], str] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def content_key(self, video_path: str) -> str:
+        """
+        Impressão digital do conteúdo de um vídeo.
+
+        Combina o tamanho do arquivo com o hash de amostras do início, do meio
+        e do fim, sem ler o arquivo inteiro. O resultado é memorizado por
+        (caminho, mtime, tamanho).
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+
+        Returns:
+            Hash hexadecimal do conteúdo
+        """
+        stats = os.stat(video_path)
+        memo_key = (os.path.abspath(video_path), stats.st_mtime, stats.st_size)
+        with self._lock:
+            if memo_key in self._fingerprints:
+                return self._fingerprints[memo_key]
+
+        digest = hashlib.sha1(str(stats.st_size).encode())
+        chunk = self.FINGERPRINT_CHUNK
+        with open(video_path, 'rb') as f:
+            for offset in sorted({0, max(0, stats.st_size // 2 - chunk // 2), max(0, stats.st_size - chunk)}):
+                f.seek(offset)
+                digest.update(f.read(chunk))
+        fingerprint = digest.hexdigest()
+
+        with self._lock:
+            self._fingerprints[memo_key] = fingerprint
+        return fingerprint
+
+    def key(self, video_path: str, settings: Dict[str, Any]) -> str:
+        """Chave da entrada de um vídeo com as configurações dadas."""
+        payload = json.dumps(track_settings(settings), sort_keys=True)
+        return hashlib.sha1(f"{self.content_key(video_path)}:{payload}".encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Caminho do arquivo de uma entrada."""
+        return os.path.join(self.directory, f"{key}{TRACK_EXTENSION}")
+
+    def contains(self, video_path: str, settings: Dict[str, Any]) -> bool:
+        """Indica se há trilha para o vídeo e as configurações, sem contar acerto ou falha."""
+        try:
+            return os.path.exists(self.path(self.key(video_path, settings)))
+        except OSError:
+            return False
+
+    def get(self, video_path: str, settings: Dict[str, Any]) -> Optional[ColorTrack]:
+        """
+        Obtém a trilha de um vídeo com as configurações dadas.
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+            settings: Configurações da sessão
+
+        Returns:
+            Trilha em cache, ou None em caso de falha
+        """
+        try:
+            path = self.path(self.key(video_path, settings))
+            track = ColorTrack.load(path)
+            # Marca a entrada como usada recentemente
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return track
+
+    def put(self, video_path: str, settings: Dict[str, Any], track: ColorTrack) -> str:
+        """
+        Guarda a trilha de um vídeo e remove as entradas menos usadas se necessário.
+
+        Args:
+            video_path: Caminho para o arquivo de vídeo
+            settings: Configurações usadas na análise
+            track: Trilha calculada
+
+        Returns:
+            Chave da entrada
+        """
+        key = self.key(video_path, settings)
+        track.save(self.path(key))
+        self.evict()
+        return key
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """Lista (último uso, tamanho, caminho) das entradas em disco."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(TRACK_EXTENSION):
+                stats = entry.stat()
+                entries.append((stats.st_mtime, stats.st_size, entry.path))
+        return entries
+
+    def evict(self) -> int:
+        """
+        Remove as entradas menos usadas até o total caber em max_bytes.
+
+        Returns:
+            Número de entradas removidas
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except OSError as e:
+                    print(f"Erro ao remover trilha {path}: {e}")
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores e ocupação do cache."""
+        with self._lock:
+            entries = self._entries()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes,
+            }
+
+
+def _analyze_segment(video_path: str, settings: Dict[str, Any], active_area: Optional[Tuple[int, int, int, int]],
+                     start_frame: int, end_frame: Optional[int], step: int, batch_size: int, fps: float,
+                     stop_event: threading.Event = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Analisa os frames [start_frame, end_frame) de um vídeo com uma captura própria.
+
+    Um frame é amostrado quando o seu índice global é múltiplo de step, de modo
+    que segmentos analisados separadamente produzem as mesmas amostras que uma
+    análise sequencial. O índice vem do instante de cada frame, e não da
+    posição pedida ao seek, que pode cair alguns frames antes ou depois: a
+    leitura começa SEEK_PREROLL_SECONDS antes do segmento e descarta os frames
+    anteriores a ele.
+
+    Returns:
+        Tupla (instantes, cores) do segmento, ou None se o vídeo não puder ser
+        lido ou a análise for interrompida
+    """
+    processor = AmbilightProcessor()
+    processor.apply_settings({key: value for key, value in settings.items() if key != 'intensity'})
+    processor.set_active_area(active_area)
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        seek_frame = max(0, start_frame - int(SEEK_PREROLL_SECONDS * fps))
+        if seek_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, seek_frame)
+
+        timestamps = []
+        colors = []
+        batch = []
+        frame_index = seek_frame - 1
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                return None
+
+            ret = cap.grab()
+            if ret:
+                # Alguns backends não informam o instante: segue a contagem de frames
+                pts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                frame_index = int(round(pts * fps)) if pts > 0 else frame_index + 1
+                if end_frame is not None and frame_index >= end_frame:
+                    ret = False
+                elif frame_index >= start_frame and frame_index % step == 0:
+                    ret, frame = cap.retrieve()
+                    if ret:
+                        timestamps.append(pts)
+                        batch.append(frame)
+
+            if batch and (not ret or len(batch) >= batch_size):
+                colors.append(processor.extract_border_colors_batch(np.stack(batch)))
+                batch = []
+
+            if not ret:
+                break
+
+        if batch:
+            colors.append(processor.extract_border_colors_batch(np.stack(batch)))
+
+        if not colors:
+            return np.empty(0), np.empty((0, 4, processor.zones_per_side, 3), dtype=np.uint8)
+        return np.array(timestamps), np.concatenate(colors)
+    finally:
+        cap.release()
+
+
+def analyze_video(video_path: str, settings: Dict[str, Any], sample_rate: float = DEFAULT_SAMPLE_RATE,
+                  batch_size: int = 32, stop_event: threading.Event = None,
+                  workers: int = 1) -> Optional[ColorTrack]:
+    """
+    Decodifica um vídeo uma única vez e calcula a sua trilha de cores.
+
+    As cores são calculadas com intensidade total; a intensidade de cada
+    sessão é aplicada ao servir a trilha. Frames entre amostras são apenas
+    avançados com grab(), e os frames amostrados são processados em lotes
+    com extract_border_colors_batch.
+
+    Com mais de um worker, o vídeo é dividido em segmentos de tempo, cada um
+    decodificado em um processo separado com a sua própria captura, e os
+    resultados são unidos em ordem.
+
+    Args:
+        video_path: Caminho para o arquivo de vídeo
+        settings: Configurações do processador (zones_per_side, color_mode, ...)
+        sample_rate: Número máximo de amostras por segundo de vídeo
+        batch_size: Número de frames processados por lote
+        stop_event: Evento para interromper a análise
+        workers: Número de processos usados na análise
+
+    Returns:
+        Trilha calculada, ou None se o vídeo não puder ser lido ou a análise for interrompida
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS) or sample_rate
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+    step = max(1, int(round(fps / sample_rate)))
+    active_area = get_active_area(video_path)
+
+    # Vídeos curtos ou sem contagem de frames confiável são analisados em sequência
+    segment_count = workers * SEGMENTS_PER_WORKER
+    if workers <= 1 or frame_count < segment_count * MIN_SEGMENT_FRAMES:
+        segment = _analyze_segment(video_path, settings, active_area, 0, None, step, batch_size, fps, stop_event)
+        if segment is None or not len(segment[0]):
+            return None
+        return ColorTrack(*segment)
+
+    # Limites dos segmentos alinhados a step, para não duplicar nem perder amostras
+    bounds = np.linspace(0, frame_count, segment_count + 1).astype(int) // step * step
+    bounds[-1] = frame_count
+    segments = [(int(start), int(end) if i < segment_count - 1 else None)
+                for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])) if end > start]
+
+    # 'spawn' evita herdar threads e locks do servidor (e do OpenCV) nos processos filhos
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    cancelled = False
+    try:
+        futures = [
+            executor.submit(_analyze_segment, video_path, settings, active_area, start, end, step, batch_size, fps)
+            for start, end in segments
+        ]
+        results = []
+        for future in futures:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    cancelled = True
+                    return None
+                try:
+                    results.append(future.result(timeout=0.5))
+                    break
+                except FuturesTimeout:
+                    continue
+    finally:
+        # Cancelada, não espera os segmentos em andamento terminarem
+        executor.shutdown(wait=not cancelled, cancel_futures=True)
+
+    if any(result is None for result in results):
+        return None
+
+    timestamps = np.concatenate([result[0] for result in results])
+    colors = np.concatenate([result[1] for result in results])
+    if not len(timestamps):
+        return None
+
+    # Seeks imprecisos podem repetir frames na junção dos segmentos: mantém só
+    # amostras posteriores a todas as anteriores, para a trilha ficar ordenada
+    keep = np.concatenate(([True], timestamps[1:] > np.maximum.accumulate(timestamps)[:-1]))
+    return ColorTrack(timestamps[keep], colors[keep])
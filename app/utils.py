@@ -275,6 +275,42 @@ def get_video_duration(filepath: str) -> float:
         print(f"Erro ao obter duração do vídeo: {e}")
         return 0.0
 
+def get_video_metadata(filepath: str) -> Dict[str, Any]:
+    """
+    Obtém os metadados de um vídeo com uma única abertura usando OpenCV.
+    
+    Args:
+        filepath: Caminho para o arquivo de vídeo
+        
+    Returns:
+        Dicionário com largura, altura, fps, número de frames, duração em segundos e codec
+        
+    Raises:
+        ValueError: Se o vídeo não puder ser aberto
+    """
+    import cv2
+    video = cv2.VideoCapture(filepath)
+    
+    try:
+        if not video.isOpened():
+            raise ValueError(f"Não foi possível abrir o vídeo: {filepath}")
+        
+        fps = video.get(cv2.CAP_PROP_FPS)
+        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(video.get(cv2.CAP_PROP_FOURCC))
+        codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\0 ')
+        
+        return {
+            'width': int(video.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': fps,
+            'frame_count': frame_count,
+            'duration': frame_count / fps if fps > 0 else 0.0,
+            'codec': codec,
+        }
+    finally:
+        video.release()
+
 def format_duration(seconds: float) -> str:
     """
     Formata uma duração em segundos para exibição.
@@ -347,4 +383,89 @@ def generate_video_thumbnail(input_file: str, output_file: str, time_offset: flo
         return True
     except Exception as e:
         print(f"Erro ao gerar miniatura do vídeo: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def generate_video_previews(input_file: str, poster_file: str, sprite_file: str, tiles: int = 100,
+                            columns: int = 10, tile_width: int = 160, poster_width: int = 320,
+                            poster_offset: float = 5.0) -> Dict[str, Any]:
+    """
+    Gera a miniatura de um vídeo e uma folha de sprites com frames igualmente espaçados.
+    
+    Tudo é obtido em uma única leitura sequencial: os frames que não são usados
+    são apenas avançados, sem conversão para imagem, e o arquivo não é
+    reposicionado nem reaberto.
+    
+    Args:
+        input_file: Caminho para o arquivo de vídeo
+        poster_file: Caminho para salvar a miniatura
+        sprite_file: Caminho para salvar a folha de sprites
+        tiles: Número de frames na folha de sprites
+        columns: Número de colunas da folha de sprites
+        tile_width: Largura de cada frame da folha (a altura segue a proporção do vídeo)
+        poster_width: Largura da miniatura
+        poster_offset: Tempo em segundos do frame da miniatura
+        
+    Returns:
+        Dicionário com a disposição da folha: colunas, linhas, tamanho dos frames,
+        número de frames e intervalo em segundos coberto por cada um
+        
+    Raises:
+        ValueError: Se o vídeo não puder ser lido
+    """
+    import cv2
+    import numpy as np
+    
+    cap = cv2.VideoCapture(input_file)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Não foi possível abrir o vídeo: {input_file}")
+        
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if frame_count <= 0 or width <= 0 or height <= 0:
+            raise ValueError(f"Vídeo sem frames: {input_file}")
+        
+        # Cada frame da folha representa o meio de um intervalo igual do vídeo
+        tiles = max(1, min(tiles, frame_count))
+        targets = {int((i + 0.5) * frame_count / tiles): i for i in range(tiles)}
+        poster_index = int(min(poster_offset, frame_count / fps / 2) * fps)
+        
+        columns = min(columns, tiles)
+        rows = (tiles + columns - 1) // columns
+        tile_height = max(2, round(tile_width * height / width / 2) * 2)
+        poster_size = (poster_width, max(2, round(poster_width * height / width / 2) * 2))
+        sprite = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+        poster = None
+        
+        last_index = max(max(targets), poster_index)
+        frame_index = 0
+        while frame_index <= last_index and cap.grab():
+            if frame_index in targets or frame_index == poster_index:
+                ret, frame = cap.retrieve()
+                if ret:
+                    if frame_index == poster_index:
+                        poster = cv2.resize(frame, poster_size, interpolation=cv2.INTER_AREA)
+                    if frame_index in targets:
+                        row, column = divmod(targets[frame_index], columns)
+                        sprite[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width] = \
+                            cv2.resize(frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA)
+            frame_index += 1
+        
+        if poster is None:
+            raise ValueError(f"Não foi possível ler o frame da miniatura: {input_file}")
+        
+        cv2.imwrite(poster_file, poster, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        cv2.imwrite(sprite_file, sprite, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        
+        return {
+            'columns': columns,
+            'rows': rows,
+            'tile_width': tile_width,
+            'tile_height': tile_height,
+            'count': tiles,
+            'interval': frame_count / tiles / fps,
+        }
+    finally:
+        cap.release()
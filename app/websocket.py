@@ -11,14 +11,19 @@ import numpy as np
 import os
 from typing import Dict, Any, Optional
 
+from app.playback import PlaybackClock, PacedCapture
+
 # Será inicializado na aplicação principal
 socketio = None
 
+# Cores enviadas por segundo de vídeo
+OUTPUT_FPS = 10.0
+
 # Registro de conexões ativas
 active_connections = {}
 
-# Threads de processamento ativas
-processing_threads = {}
+# Tarefas de processamento ativas
+processing_tasks = {}
 
 # Eventos para controlar threads
 stop_events = {}
@@ -62,12 +67,16 @@ def configure_events():
         client_id = request.sid
         
         # Interrompe qualquer processamento para este cliente
-        stop_processing(client_id)
+        finished = stop_processing(client_id)
         
         # Remove das conexões ativas
         if client_id in active_connections:
             active_connections.pop(client_id)
         
+        # Devolve o processador da sessão ao pool, se a tarefa não o estiver mais usando
+        from app.routes import processor_pool
+        processor_pool.release(client_id, reuse=finished)
+        
         print(f"Cliente desconectado: {client_id}")
     
     @socketio.on('start_video_processing')
@@ -96,18 +105,22 @@ def configure_events():
         
         # Cria um novo evento de parada
         stop_event = threading.Event()
-        stop_events[client_id] = stop_event
         
-        # Inicia uma nova thread de processamento
-        thread = threading.Thread(
-            target=process_video,
-            args=(video_path, client_id, stop_event)
-        )
-        thread.daemon = True
-        thread.start()
+        # Agenda o processamento no agendador compartilhado, com prioridade de reprodução
+        from app.routes import task_scheduler
+        from app.scheduler import SchedulerFull, PRIORITY_INTERACTIVE
+        try:
+            task = task_scheduler.submit(
+                process_video, video_path, client_id, stop_event,
+                priority=PRIORITY_INTERACTIVE, name=f'play:{client_id}', stop_event=stop_event
+            )
+        except SchedulerFull as e:
+            emit('error', {'message': f'Servidor ocupado: {str(e)}'})
+            return
         
-        # Registra a thread
-        processing_threads[client_id] = thread
+        # Registra a tarefa
+        stop_events[client_id] = stop_event
+        processing_tasks[client_id] = task
         
         # Atualiza o status da conexão
         if client_id in active_connections:
@@ -133,10 +146,12 @@ def configure_events():
         Args:
             data: Dicionário com as configurações
         """
-        from app import ambilight_processor
+        from app.routes import processor_pool, get_settings
         
         try:
-            # Atualiza as configurações no processador
+            # Atualiza as configurações apenas no processador desta sessão
+            ambilight_processor = processor_pool.acquire(request.sid, get_settings())
+            
             if 'zones_per_side' in data:
                 ambilight_processor.set_zones_per_side(int(data['zones_per_side']))
             
@@ -170,16 +185,21 @@ def stop_processing(client_id):
     
     Args:
         client_id: ID do cliente
+        
+    Returns:
+        True se não havia tarefa ou ela terminou dentro do tempo de espera
     """
+    finished = True
+    
     # Define o evento de parada, se existir
     if client_id in stop_events:
         stop_events[client_id].set()
     
-    # Aguarda o término da thread, se existir
-    if client_id in processing_threads:
-        thread = processing_threads.pop(client_id)
-        if thread and thread.is_alive():
-            thread.join(timeout=1.0)
+    # Cancela a tarefa e aguarda o seu término, se existir
+    if client_id in processing_tasks:
+        task = processing_tasks.pop(client_id)
+        task.cancel()
+        finished = task.wait(timeout=1.0)
     
     # Remove o evento de parada
     if client_id in stop_events:
@@ -188,6 +208,8 @@ def stop_processing(client_id):
     # Atualiza o status da conexão
     if client_id in active_connections:
         active_connections[client_id]['processing'] = False
+    
+    return finished
 
 def process_video(video_path, client_id, stop_event):
     """
@@ -199,7 +221,11 @@ def process_video(video_path, client_id, stop_event):
         stop_event: Evento para interromper o processamento
     """
     # Import aqui para evitar importação circular
-    from app.routes import ambilight_processor
+    from app.routes import processor_pool, get_settings
+    
+    # Processador exclusivo desta sessão
+    ambilight_processor = processor_pool.acquire(client_id, get_settings())
+    ambilight_processor.reset()
     
     try:
         cap = cv2.VideoCapture(video_path)
@@ -209,30 +235,17 @@ def process_video(video_path, client_id, stop_event):
                 socketio.emit('error', {'message': 'Não foi possível abrir o vídeo'}, room=client_id)
             return
         
-        frame_count = 0
-        
-        while not stop_event.is_set():
-            ret, frame = cap.read()
-            
-            if not ret:
-                # Reinicia o vídeo quando terminar
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                continue
-            
-            # Processa apenas 1 a cada 3 frames para melhor desempenho
-            if frame_count % 3 == 0:
-                try:
-                    colors = ambilight_processor.extract_border_colors(frame)
-                    
-                    if socketio and client_id in active_connections:
-                        socketio.emit('colors', colors, room=client_id)
-                except Exception as e:
-                    print(f"Erro ao processar frame: {e}")
-            
-            frame_count += 1
-            
-            # Limita a taxa de frames para não sobrecarregar o cliente
-            time.sleep(0.03)  # Aprox. 30fps
+        # Sem sincronização com o player, o relógio corre livre e o vídeo reinicia ao final
+        capture = PacedCapture(cap, PlaybackClock(), output_fps=OUTPUT_FPS)
+        
+        for frame, _ in capture.frames(stop_event):
+            try:
+                colors = ambilight_processor.extract_border_colors(frame)
+                
+                if socketio and client_id in active_connections:
+                    socketio.emit('colors', colors, room=client_id)
+            except Exception as e:
+                print(f"Erro ao processar frame: {e}")
     
     except Exception as e:
         if socketio:
@@ -1,6 +1,8 @@
 
-from app import app, socketio
-
 if __name__ == "__main__":
+    # Importado apenas aqui: os processos de análise de trilhas ('spawn')
+    # executam este arquivo de novo e não devem iniciar o servidor
+    from app import app, socketio
+    
     # Iniciar o servidor com suporte a WebSockets
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True)
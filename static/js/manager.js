@@ -228,6 +228,7 @@ async function uploadVideoInChunks(file) {
         // Verificar se há miniatura
         if (video.thumbnail) {
             const thumbnail = videoItem.querySelector('.thumbnail');
+            const placeholder = thumbnail.innerHTML;
             thumbnail.innerHTML = '';
             
             const img = document.createElement('img');
@@ -235,6 +236,11 @@ async function uploadVideoInChunks(file) {
             img.alt = video.filename;
             img.className = 'w-full h-full object-cover';
             
+            // Miniatura ainda não gerada: mantém o ícone padrão
+            img.onerror = () => {
+                thumbnail.innerHTML = placeholder;
+            };
+            
             thumbnail.appendChild(img);
         }
         
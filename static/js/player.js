@@ -144,12 +144,52 @@ document.addEventListener('DOMContentLoaded', () => {
                 const seekTime = (progressBar.value / 100) * videoPlayer.duration;
                 videoPlayer.currentTime = seekTime;
             });
+            
+            // Prévia do frame ao passar o mouse sobre a barra
+            setupSeekPreview();
         }
         
         // Auto-hide dos controles
         setupControlsVisibility();
     }
     
+    /**
+     * Configura a prévia da barra de progresso a partir da folha de sprites do vídeo,
+     * sem decodificar nada no servidor durante a navegação
+     */
+    function setupSeekPreview() {
+        const videoPath = videoPlayer.getAttribute('data-path');
+        if (!videoPath) return;
+        const filename = videoPath.split('/').pop();
+        
+        fetch(`/api/thumbnails/${filename}`)
+            .then(response => response.ok ? response.json() : null)
+            .then(sprite => {
+                if (!sprite || !sprite.success) return;
+                
+                const preview = document.createElement('div');
+                preview.className = 'absolute bottom-6 rounded shadow-lg pointer-events-none hidden';
+                preview.style.width = `${sprite.tile_width}px`;
+                preview.style.height = `${sprite.tile_height}px`;
+                preview.style.backgroundImage = `url(${sprite.sprite})`;
+                progressBar.parentElement.appendChild(preview);
+                
+                progressBar.addEventListener('mousemove', (e) => {
+                    const rect = progressBar.getBoundingClientRect();
+                    const ratio = Math.min(Math.max((e.clientX - rect.left) / rect.width, 0), 1);
+                    const duration = videoPlayer.duration || sprite.interval * sprite.count;
+                    const tile = Math.min(Math.floor(ratio * duration / sprite.interval), sprite.count - 1);
+                    
+                    preview.style.backgroundPosition =
+                        `-${(tile % sprite.columns) * sprite.tile_width}px -${Math.floor(tile / sprite.columns) * sprite.tile_height}px`;
+                    preview.style.left = `${Math.min(Math.max(ratio * rect.width - sprite.tile_width / 2, 0), rect.width - sprite.tile_width)}px`;
+                    preview.classList.remove('hidden');
+                });
+                progressBar.addEventListener('mouseleave', () => preview.classList.add('hidden'));
+            })
+            .catch(error => console.error('Erro ao carregar prévias:', error));
+    }
+    
     /**
      * Configurar visibilidade automática dos controles
      */
@@ -14,6 +14,21 @@
     let reconnectTimeout;
     let autoReconnectEnabled = true;
     
+    // Últimas cores completas recebidas do servidor (base para os deltas)
+    let lastServerColors = null;
+    
+    // Fluxo e número de sequência da última mensagem binária de cores aplicada
+    let lastBinaryStream = null;
+    let lastBinarySequence = 0;
+    
+    // Mensagens 'colors_bin' (ColorFrame.to_bytes): cabeçalho de 4 bytes (versão,
+    // bordas, zonas por borda); na versão 2, seguido de fluxo, sequência e instante
+    const BINARY_HEADER_SIZE = 4;
+    const BINARY_STAMP_SIZE = 16;
+    const BINARY_VERSION = 1;
+    const BINARY_STAMPED_VERSION = 2;
+    const SIDES = ['top', 'right', 'bottom', 'left'];
+    
     // Inicialização
     initWebSocket();
     
@@ -169,6 +184,10 @@
                 const hasValidData = colors && colors.top && colors.top.length > 0;
                 console.log('Cores recebidas:', hasValidData ? 'Dados válidos' : 'Dados vazios');
                 
+                if (hasValidData) {
+                    lastServerColors = colors;
+                }
+                
                 // Importante: Aplicar cores diretamente
                 if (window.updateAmbilightColors && hasValidData) {
                     window.updateAmbilightColors(colors);
@@ -179,10 +198,54 @@
                 }
             });
             
+            // Evento: Recebe apenas as zonas alteradas desde o último envio
+            socketConnection.on('colors_delta', (delta) => {
+                // Sem um keyframe completo não há base para aplicar o delta
+                if (!lastServerColors || !delta) return;
+                
+                const colors = {};
+                ['top', 'right', 'bottom', 'left'].forEach(side => {
+                    colors[side] = lastServerColors[side].slice();
+                    (delta[side] || []).forEach(([index, color]) => {
+                        if (index < colors[side].length) {
+                            colors[side][index] = color;
+                        }
+                    });
+                });
+                lastServerColors = colors;
+                
+                if (window.updateAmbilightColors) {
+                    window.updateAmbilightColors(colors);
+                }
+            });
+            
+            // Evento: Recebe as cores em formato binário
+            socketConnection.on('colors_bin', (data) => {
+                const message = decodeBinaryColors(data);
+                if (!message) return;
+                
+                // Um novo fluxo (outro codificador no servidor) recomeça a numeração
+                if (message.stream !== null) {
+                    if (message.stream === lastBinaryStream && message.sequence <= lastBinarySequence) return;
+                    lastBinaryStream = message.stream;
+                    lastBinarySequence = message.sequence;
+                }
+                lastServerColors = message.colors;
+                
+                if (window.updateAmbilightColors) {
+                    window.updateAmbilightColors(message.colors);
+                }
+            });
+            
+            // Evento: O servidor não está acompanhando a reprodução
+            socketConnection.on('processing_lag', (data) => {
+                console.warn(`Processamento atrasado ${data.lag}s (${data.dropped} frames perdidos)`);
+            });
+            
             // Evento: Processamento de vídeo iniciado
             socketConnection.on('processing_started', (data) => {
                 if (data.success) {
-                    console.log('Processamento de vídeo iniciado');
+                    console.log('Processamento de vídeo iniciado', data.shared ? `(compartilhado, ${data.viewers} sessões)` : '');
                     showNotification('Efeito Ambilight ativado', 'success');
                 }
             });
@@ -295,6 +358,73 @@
         }
     }
     
+    /**
+     * Envia ao servidor os eventos de reprodução do player, para que as cores
+     * acompanhem o instante exibido e o servidor fique ocioso com o vídeo pausado
+     * @param {HTMLVideoElement} videoPlayer - Elemento de vídeo
+     */
+    function attachPlaybackSync(videoPlayer) {
+        if (!videoPlayer || videoPlayer.dataset.playbackSync) return;
+        videoPlayer.dataset.playbackSync = 'true';
+        
+        const report = (event) => {
+            if (socketConnection && socketConnection.connected) {
+                socketConnection.emit('playback_sync', {
+                    event: event,
+                    media_time: videoPlayer.currentTime,
+                    rate: videoPlayer.playbackRate
+                });
+            }
+        };
+        
+        // 'playing' e 'waiting' acompanham também as pausas por falta de buffer
+        videoPlayer.addEventListener('playing', () => report('play'));
+        videoPlayer.addEventListener('pause', () => report('pause'));
+        videoPlayer.addEventListener('waiting', () => report('pause'));
+        videoPlayer.addEventListener('ended', () => report('pause'));
+        videoPlayer.addEventListener('seeked', () => report('seek'));
+        videoPlayer.addEventListener('ratechange', () => report('rate'));
+    }
+    
+    /**
+     * Decodifica uma mensagem 'colors_bin' do servidor
+     * @param {ArrayBuffer|Uint8Array} data - Cabeçalho, marcação opcional e cores uint8 [R, G, B]
+     * @returns {Object|null} {stream, sequence, mediaTime, colors}, ou null se a mensagem for inválida;
+     *     sem marcação (versão 1), stream, sequence e mediaTime são null
+     */
+    function decodeBinaryColors(data) {
+        const bytes = data instanceof Uint8Array ? data : new Uint8Array(data);
+        if (bytes.byteLength < BINARY_HEADER_SIZE) return null;
+        
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        const version = view.getUint8(0);
+        const sides = view.getUint8(1);
+        const zonesPerSide = view.getUint16(2, true);
+        const stamped = version === BINARY_STAMPED_VERSION;
+        let offset = BINARY_HEADER_SIZE + (stamped ? BINARY_STAMP_SIZE : 0);
+        if ((version !== BINARY_VERSION && !stamped) || sides !== SIDES.length
+                || bytes.byteLength < offset + sides * zonesPerSide * 3) {
+            console.warn('Mensagem binária de cores inválida');
+            return null;
+        }
+        
+        const colors = {};
+        SIDES.forEach(side => {
+            const zones = new Array(zonesPerSide);
+            for (let i = 0; i < zonesPerSide; i++, offset += 3) {
+                zones[i] = [bytes[offset], bytes[offset + 1], bytes[offset + 2]];
+            }
+            colors[side] = zones;
+        });
+        
+        return {
+            stream: stamped ? view.getUint32(4, true) : null,
+            sequence: stamped ? view.getUint32(8, true) : null,
+            mediaTime: stamped ? view.getFloat64(12, true) : null,
+            colors: colors
+        };
+    }
+    
     /**
      * Expõe funções de WebSocket globalmente
      */
@@ -311,7 +441,22 @@
             
             if (socketConnection && socketConnection.connected) {
                 console.log("Iniciando processamento do vídeo:", videoPath);
-                socketConnection.emit('start_video_processing', { video_path: videoPath });
+                lastServerColors = null;
+                lastBinaryStream = null;
+                lastBinarySequence = 0;
+                
+                // Informa o estado atual do player para o servidor acompanhar a reprodução
+                const videoPlayer = document.getElementById('video-player');
+                attachPlaybackSync(videoPlayer);
+                socketConnection.emit('start_video_processing', {
+                    video_path: videoPath,
+                    emission: 'binary',
+                    media_time: videoPlayer ? videoPlayer.currentTime : 0,
+                    paused: videoPlayer ? videoPlayer.paused : false,
+                    rate: videoPlayer ? videoPlayer.playbackRate : 1,
+                    // ?shared na URL: assiste junto com as outras sessões do mesmo vídeo
+                    shared: new URLSearchParams(window.location.search).has('shared')
+                });
             } else {
                 console.error('Socket não conectado. Não é possível iniciar o processamento.');
                 showNotification('Erro de conexão com o servidor', 'error');